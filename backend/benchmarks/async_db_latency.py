@@ -0,0 +1,120 @@
+"""Latency of concurrent provider GETs while provider updates are running.
+
+Builds a throwaway SQLite database from ``schema_sqlite.sql``, seeds it with
+providers and drives the app in-process through ``httpx.ASGITransport`` so
+that any blocking call inside a handler shows up directly as tail latency of
+the other in-flight requests.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.async_db_latency --providers 2000 --concurrency 50 --requests 4000 --writers 4
+
+Requires ``httpx`` in addition to the app requirements.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_database(path: str, providers: int) -> list:
+    with open(os.path.join(BACKEND_DIR, "schema_sqlite.sql")) as f:
+        schema = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    now = datetime.utcnow()
+    ids = [str(uuid.uuid4()) for _ in range(providers)]
+    conn.executemany(
+        "INSERT INTO providers (id, email, full_name, password, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(pid, f"provider{i}@example.com", f"Provider {i}", "x", now, now) for i, pid in enumerate(ids)],
+    )
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    writes = 0
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def reader(queue: asyncio.Queue):
+            while True:
+                try:
+                    provider_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                response = await client.get(f"/api/providers/{provider_id}")
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        async def writer():
+            nonlocal writes
+            while not stop.is_set():
+                provider_id = random.choice(args.ids)
+                response = await client.put(
+                    f"/api/providers/{provider_id}",
+                    data={"phone": str(random.randint(10**9, 10**10))},
+                )
+                response.raise_for_status()
+                writes += 1
+
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(random.choice(args.ids))
+
+        writer_tasks = [asyncio.create_task(writer()) for _ in range(args.writers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(reader(queue) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*writer_tasks)
+
+    print(f"GET requests:   {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s)")
+    print(f"Writes:         {writes} ({args.writers} concurrent writers)")
+    print(f"p50 latency:    {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"p95 latency:    {percentile(latencies, 95) * 1000:.2f} ms")
+    print(f"p99 latency:    {percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"max latency:    {max(latencies) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-")
+    db_path = os.path.join(tmpdir, "bench.db")
+    args.ids = build_database(db_path, args.providers)
+    # database.py reads the path at import time
+    os.environ["SQLITE_DB_PATH"] = db_path
+    os.chdir(BACKEND_DIR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
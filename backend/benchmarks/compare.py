@@ -0,0 +1,55 @@
+"""Compare two ``benchmarks.run`` reports, e.g. before and after a change.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.compare base.json head.json
+"""
+import argparse
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(old, new) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(base: dict, head: dict) -> list:
+    """Rows of (concurrency, operation, metric, base, head, change) for levels present in both."""
+    rows = []
+    head_levels = {level["concurrency"]: level for level in head["levels"]}
+    for base_level in base["levels"]:
+        head_level = head_levels.get(base_level["concurrency"])
+        if head_level is None:
+            continue
+        operations = sorted(set(base_level["routes"]) & set(head_level["routes"]))
+        for operation in ["all", *operations]:
+            old = base_level if operation == "all" else base_level["routes"][operation]
+            new = head_level if operation == "all" else head_level["routes"][operation]
+            for metric in METRICS:
+                if metric in old and metric in new:
+                    rows.append((base_level["concurrency"], operation, metric, old[metric], new[metric],
+                                 change(old[metric], new[metric])))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"base: {base['meta'].get('commit')}  head: {head['meta'].get('commit')}")
+    print(f"{'conc':>5}  {'operation':<16} {'metric':<15} {'base':>10} {'head':>10} {'change':>8}")
+    for concurrency, operation, metric, old, new, delta in compare(base, head):
+        print(f"{concurrency:>5}  {operation:<16} {metric:<15} {old:>10.2f} {new:>10.2f} {delta:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Generate synthetic SQLite databases from ``schema_sqlite.sql``.
+
+Rows are deterministic for a given seed, so two runs at the same scale load the
+same data. Every account shares the password ``BENCH_PASSWORD``, hashed once
+with the app's bcrypt settings, so the workload can log in as any seeded email.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.datagen --scale 100k --out /tmp/bench-100k.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(BACKEND_DIR, "schema_sqlite.sql")
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 10_000
+
+SERVICE_TYPES = ("Cleaning", "Plumbing", "Electrical", "Painting", "Carpentry", "Landscaping")
+LOCATIONS = ("Cape Town", "Johannesburg", "Durban", "Pretoria", "Lahore", "Karachi", "Islamabad", "Nairobi")
+WORDS = ("Swift", "Bright", "Prime", "Reliable", "Handy", "Expert", "City", "Home", "Pro", "Eco")
+
+
+def parse_scale(value: str) -> int:
+    """'10k', '1M' or a plain row count."""
+    return SCALES.get(value.lower()) or int(value)
+
+
+def provider_email(i: int) -> str:
+    return f"provider{i}@bench.example.com"
+
+
+def user_email(i: int) -> str:
+    return f"user{i}@bench.example.com"
+
+
+def _provider_rows(count: int, password: str, rng: random.Random, epoch: datetime):
+    for i in range(count):
+        created = epoch + timedelta(seconds=i, microseconds=rng.randrange(1_000_000))
+        provider_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        rating, reviews_count = round(rng.uniform(0, 5), 1), rng.randrange(200)
+        # Keep the running totals consistent with each other, as the review service would
+        rating_sum = round(rating * reviews_count)
+        yield (
+            provider_id,
+            provider_email(i),
+            f"Provider {i}",
+            password,
+            f"+27 {rng.randrange(10**8, 10**9)}",
+            f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+            rng.choice(SERVICE_TYPES),
+            round(rng.uniform(50, 1500), 2),
+            rng.choice(LOCATIONS),
+            "Mon-Fri 08:00-17:00",
+            rating_sum / reviews_count if reviews_count else 0.0,
+            rating_sum,
+            reviews_count,
+            rng.random() < 0.3,
+            created,
+            created,
+            rng.random() < 0.95,
+        )
+
+
+def _user_rows(count: int, password: str, rng: random.Random, epoch: datetime):
+    for i in range(count):
+        created = epoch + timedelta(seconds=i, microseconds=rng.randrange(1_000_000))
+        yield (
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            user_email(i),
+            f"User {i}",
+            password,
+            created,
+            created,
+            True,
+        )
+
+
+def _insert(conn, query: str, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(query, batch)
+            batch = []
+    if batch:
+        conn.executemany(query, batch)
+
+
+def generate(path: str, providers: int, users: int, seed: int = 1) -> dict:
+    """Create ``path`` (replacing it) and fill it; returns a summary for the report."""
+    from modules.passwords import pwd_context
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+
+    started = time.perf_counter()
+    password = pwd_context.hash(BENCH_PASSWORD)
+    rng = random.Random(seed)
+    epoch = datetime(2024, 1, 1)
+
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    # Bulk-load settings; the app reopens the file with its own pragmas
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    with conn:
+        _insert(
+            conn,
+            """
+            INSERT INTO providers (
+                id, email, full_name, password, phone, business_name, service_type, hourly_rate,
+                location, working_hours, rating, rating_sum, reviews_count, is_verified, created_at, updated_at,
+                is_active
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            _provider_rows(providers, password, rng, epoch),
+        )
+        _insert(
+            conn,
+            "INSERT INTO users (id, email, full_name, password, created_at, updated_at, is_active)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _user_rows(users, password, rng, epoch),
+        )
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    return {
+        "providers": providers,
+        "users": users,
+        "seed": seed,
+        "generate_seconds": round(time.perf_counter() - started, 2),
+        "size_bytes": os.path.getsize(path),
+    }
+
+
+def sample_ids(path: str, table: str, limit: int, seed: int = 1) -> list:
+    """A reproducible random sample of ids from ``table``."""
+    conn = sqlite3.connect(path)
+    try:
+        max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+        rng = random.Random(seed)
+        rowids = rng.sample(range(1, max_rowid + 1), min(limit, max_rowid))
+        ids = []
+        # Generated tables have dense rowids, so this is a handful of index seeks
+        for start in range(0, len(rowids), 500):
+            chunk = rowids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            ids.extend(row[0] for row in conn.execute(
+                f"SELECT id FROM {table} WHERE rowid IN ({placeholders})", chunk
+            ))
+        return ids
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k", help="rows per table: 1k, 10k, 100k, 1M or a number")
+    parser.add_argument("--providers", help="override the provider count")
+    parser.add_argument("--users", help="override the user count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", required=True, help="database file to create")
+    args = parser.parse_args()
+
+    rows = parse_scale(args.scale)
+    summary = generate(
+        args.out,
+        providers=parse_scale(args.providers) if args.providers else rows,
+        users=parse_scale(args.users) if args.users else rows,
+        seed=args.seed,
+    )
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""End-to-end API benchmark: generate data, start uvicorn, drive a mixed workload.
+
+Generated databases are cached in ``--data-dir`` by scale and seed and copied
+to a scratch file for each run, so writes from one run never leak into the
+next. Results are written as JSON (see ``benchmarks/compare.py`` to diff two
+runs) with throughput and p50/p95/p99 per operation at each concurrency level.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.run --scale 100k --concurrency 1,16,64 --duration 30 --output bench.json
+
+Requires ``httpx`` in addition to the app requirements.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from .datagen import BACKEND_DIR, generate, parse_scale, sample_ids
+from .server import run_server
+from .workload import DEFAULT_MIX, Dataset, parse_mix, run_level
+
+SAMPLE_IDS = 5000
+
+
+def git_revision() -> dict:
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def prepare_database(data_dir: str, providers: int, users: int, seed: int, regenerate: bool) -> tuple:
+    """Cached database for these parameters, generating it if needed; returns (path, summary)."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench-p{providers}-u{users}-s{seed}.db")
+    summary_path = path + ".json"
+    if regenerate or not (os.path.exists(path) and os.path.exists(summary_path)):
+        summary = generate(path, providers, users, seed)
+        with open(summary_path, "w") as f:
+            json.dump(summary, f)
+    with open(summary_path) as f:
+        return path, json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k", help="rows per table: 1k, 10k, 100k, 1M or a number")
+    parser.add_argument("--providers", help="override the provider count")
+    parser.add_argument("--users", help="override the user count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", default="1,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3, help="unrecorded seconds before each level")
+    parser.add_argument("--mix", help="operation weights, e.g. get_provider=50,login=5 (default: %s)" % (
+        ",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items())))
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "marketplace-bench"))
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the cached database")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    rows = parse_scale(args.scale)
+    providers = parse_scale(args.providers) if args.providers else rows
+    users = parse_scale(args.users) if args.users else rows
+    levels = [int(level) for level in args.concurrency.split(",")]
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+
+    sys.path.insert(0, BACKEND_DIR)
+    source, dataset_summary = prepare_database(args.data_dir, providers, users, args.seed, args.regenerate)
+    dataset = Dataset(
+        provider_ids=sample_ids(source, "providers", SAMPLE_IDS, args.seed),
+        user_ids=sample_ids(source, "users", SAMPLE_IDS, args.seed),
+        providers=providers,
+        users=users,
+    )
+
+    scratch = tempfile.mkdtemp(prefix="bench-run-")
+    db_path = os.path.join(scratch, "app.db")
+    shutil.copyfile(source, db_path)
+    results = []
+    try:
+        def drive(base_url):
+            for level in levels:
+                print(f"concurrency {level}: {args.warmup:g}s warmup + {args.duration:g}s", file=sys.stderr)
+                result = asyncio.run(run_level(
+                    base_url, dataset, level, args.duration, args.warmup, mix, args.seed
+                ))
+                print(f"  {result['errors']} errors, {result['rate_limited']} rate limited (429)", file=sys.stderr)
+                results.append(result)
+
+        if args.url:
+            drive(args.url)
+        else:
+            with run_server(
+                db_path,
+                os.path.join(scratch, "uploads"),
+                workers=args.server_workers,
+                log_path=os.path.join(scratch, "server.log"),
+            ) as base_url:
+                drive(base_url)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "server_workers": None if args.url else args.server_workers,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "dataset": dataset_summary,
+        },
+        "levels": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Rows/second of the provider list response: model-per-row vs. the fast path.
+
+The old path builds a ``ProviderInDB`` per row and lets FastAPI validate the
+list against the response model, run ``jsonable_encoder`` and ``json.dumps``.
+The new path only fixes up booleans/timestamps (``row_converter``) and hands
+the dicts to orjson. Both outputs are checked to decode to the same JSON.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.serialization --rows 100 --repeat 200
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from modules.providers.models import ProviderInDB, ProviderPublic
+from modules.serialization import row_converter
+
+
+def make_rows(count: int) -> List[dict]:
+    """Rows shaped like sqlite3.Row dicts: 0/1 booleans, space-separated timestamps."""
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        ts = str(start + timedelta(minutes=i, microseconds=i))
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "email": f"provider{i}@example.com",
+            "full_name": f"Provider {i}",
+            "password": "$2b$12$" + "x" * 53,
+            "phone": "+27 82 000 0000",
+            "business_name": f"Business {i}",
+            "service_type": "Plumbing",
+            "hourly_rate": 250.0 + i % 50,
+            "location": "Cape Town",
+            "working_hours": "Mon-Fri 08:00-17:00",
+            "sa_front_id": None,
+            "sa_back_id": None,
+            "profile_photo": f"/uploaded_images/blobs/aa/bb/{i:064x}.jpg",
+            "profile_photo_thumb": None,
+            "profile_photo_medium": None,
+            "rating": 4.5,
+            "reviews_count": i % 20,
+            "is_verified": i % 2,
+            "image": "/images/placeholder.jpg",
+            "created_at": ts,
+            "updated_at": ts,
+            "is_active": 1,
+        })
+    return rows
+
+
+def old_path(rows: List[dict], adapter: TypeAdapter) -> bytes:
+    models = [ProviderInDB(**row) for row in rows]
+    validated = adapter.validate_python([m.model_dump() for m in models])
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def new_path(rows: List[dict], convert) -> bytes:
+    public = [{k: row[k] for k in ProviderPublic.model_fields} for row in rows]
+    return orjson.dumps([convert(row) for row in public])
+
+
+def measure(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100, help="rows per response")
+    parser.add_argument("--repeat", type=int, default=200, help="responses to serialize per path")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    adapter = TypeAdapter(List[ProviderPublic])
+    convert = row_converter(ProviderPublic)
+
+    if json.loads(old_path(rows, adapter)) != json.loads(new_path([dict(r) for r in rows], convert)):
+        raise SystemExit("Output mismatch between old and new serialization paths")
+
+    old = measure(lambda: old_path(rows, adapter), args.repeat)
+    new = measure(lambda: new_path([dict(r) for r in rows], convert), args.repeat)
+    total = args.rows * args.repeat
+    print(f"old path: {total / old:12,.0f} rows/s")
+    print(f"new path: {total / new:12,.0f} rows/s  ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
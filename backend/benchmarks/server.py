@@ -0,0 +1,77 @@
+"""Run ``main:app`` under uvicorn in a subprocess against a given database."""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The load suite sends every request from 127.0.0.1 and logs into a fixed set
+# of accounts, so the auth rate limits would otherwise be what login and
+# register measure. Values from the environment or ``env`` take precedence.
+SERVER_ENV_DEFAULTS = {
+    "AUTH_IP_RATE_PER_MINUTE": "0",
+    "AUTH_ACCOUNT_RATE_PER_MINUTE": "0",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+@contextmanager
+def run_server(
+    db_path: str,
+    upload_dir: str,
+    port: Optional[int] = None,
+    workers: int = 1,
+    env: Optional[dict] = None,
+    log_path: Optional[str] = None,
+    startup_timeout: float = 30,
+) -> Iterator[str]:
+    """Start uvicorn, yield its base URL once ``/`` answers, and stop it on exit."""
+    port = port or free_port()
+    child_env = dict(SERVER_ENV_DEFAULTS)
+    child_env.update(os.environ)
+    child_env.update(env or {})
+    child_env["SQLITE_DB_PATH"] = db_path
+    child_env["UPLOAD_DIR"] = upload_dir
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--no-access-log", "--log-level", "warning",
+    ]
+    log = open(log_path, "ab") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=child_env, stdout=log, stderr=log)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url + "/", process, startup_timeout)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if log_path:
+            log.close()
@@ -0,0 +1,218 @@
+"""Mixed API workload driven at a fixed concurrency against a running server.
+
+Each worker loops for the measured duration, picking an operation by weight
+from ``DEFAULT_MIX`` with its own seeded RNG, and records the latency and
+outcome under the operation's name. A 429 counts as rate limited; any other
+status >= 400 or transport error counts as an error.
+"""
+import asyncio
+import io
+import random
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from .datagen import BENCH_PASSWORD, provider_email, user_email
+
+# operation -> relative weight
+DEFAULT_MIX = {
+    "get_provider": 35,
+    "get_user": 10,
+    "list_providers": 15,
+    "list_users": 5,
+    "login": 5,
+    "register": 3,
+    "update_profile": 10,
+    "upload": 2,
+}
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """'get_provider=50,login=5' -> weights; unknown operations are rejected."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = int(weight)
+    return mix
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@dataclass
+class Dataset:
+    provider_ids: List[str]
+    user_ids: List[str]
+    providers: int
+    users: int
+
+
+@dataclass
+class Recorder:
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    rate_limited: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    error_samples: Dict[str, str] = field(default_factory=dict)
+
+    def record(self, operation: str, seconds: float, error: str = None, limited: bool = False):
+        self.latencies[operation].append(seconds)
+        if limited:
+            self.rate_limited[operation] += 1
+        elif error:
+            self.errors[operation] += 1
+            self.error_samples.setdefault(operation, error)
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for operation in sorted(self.latencies):
+            samples = self.latencies[operation]
+            routes[operation] = {
+                "requests": len(samples),
+                "errors": self.errors[operation],
+                "rate_limited": self.rate_limited[operation],
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "max_ms": round(max(samples) * 1000, 3),
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "rate_limited": sum(self.rate_limited.values()),
+            "throughput_rps": round(total / elapsed, 2),
+            "routes": routes,
+            "error_samples": dict(self.error_samples),
+        }
+
+
+def _png(rng: random.Random) -> bytes:
+    from PIL import Image
+
+    # A distinct colour per upload so the blob store can't dedupe them away
+    image = Image.new("RGB", (256, 256), tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+async def op_get_provider(client, rng, data: Dataset):
+    return await client.get(f"/api/providers/{rng.choice(data.provider_ids)}")
+
+
+async def op_get_user(client, rng, data: Dataset):
+    return await client.get(f"/api/users/{rng.choice(data.user_ids)}")
+
+
+async def op_list_providers(client, rng, data: Dataset):
+    # First page, then a couple of cursor pages as a client scrolling would
+    response = await client.get("/api/providers/", params={"limit": 20})
+    for _ in range(rng.randrange(3)):
+        cursor = response.headers.get("x-next-cursor")
+        if response.status_code >= 400 or not cursor:
+            break
+        response = await client.get("/api/providers/", params={"limit": 20, "cursor": cursor})
+    return response
+
+
+async def op_list_users(client, rng, data: Dataset):
+    return await client.get("/api/users/", params={"limit": 20})
+
+
+async def op_login(client, rng, data: Dataset):
+    if rng.random() < 0.5:
+        path, email = "/api/providers/login", provider_email(rng.randrange(data.providers))
+    else:
+        path, email = "/api/users/login", user_email(rng.randrange(data.users))
+    return await client.post(path, data={"username": email, "password": BENCH_PASSWORD})
+
+
+async def op_register(client, rng, data: Dataset):
+    email = f"new-{uuid.UUID(int=rng.getrandbits(128))}@bench.example.com"
+    payload = {"email": email, "full_name": "Bench User", "password": BENCH_PASSWORD}
+    path = "/api/providers/register" if rng.random() < 0.5 else "/api/users/register"
+    return await client.post(path, json=payload)
+
+
+async def op_update_profile(client, rng, data: Dataset):
+    return await client.put(
+        f"/api/providers/{rng.choice(data.provider_ids)}",
+        data={"phone": f"+27 {rng.randrange(10**8, 10**9)}", "working_hours": "Mon-Sat 07:00-18:00"},
+    )
+
+
+async def op_upload(client, rng, data: Dataset):
+    return await client.put(
+        f"/api/providers/{rng.choice(data.provider_ids)}",
+        files={"profile_photo": ("photo.png", _png(rng), "image/png")},
+    )
+
+
+OPERATIONS = {
+    "get_provider": op_get_provider,
+    "get_user": op_get_user,
+    "list_providers": op_list_providers,
+    "list_users": op_list_users,
+    "login": op_login,
+    "register": op_register,
+    "update_profile": op_update_profile,
+    "upload": op_upload,
+}
+
+
+async def run_level(
+    base_url: str,
+    data: Dataset,
+    concurrency: int,
+    duration: float,
+    warmup: float = 0,
+    mix: Dict[str, int] = None,
+    seed: int = 1,
+    timeout: float = 60,
+) -> dict:
+    """Run ``concurrency`` workers for ``warmup`` + ``duration`` seconds; only the latter is recorded."""
+    import httpx
+
+    mix = mix or DEFAULT_MIX
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        loop = asyncio.get_running_loop()
+        measure_from = loop.time() + warmup
+        stop_at = measure_from + duration
+
+        async def worker(index: int):
+            rng = random.Random(seed * 100_003 + index)
+            while loop.time() < stop_at:
+                operation = rng.choices(names, weights)[0]
+                measured = loop.time() >= measure_from
+                started = time.perf_counter()
+                error = None
+                limited = False
+                try:
+                    response = await OPERATIONS[operation](client, rng, data)
+                    limited = response.status_code == 429
+                    if response.status_code >= 400:
+                        error = f"HTTP {response.status_code}: {response.text[:200]}"
+                except httpx.HTTPError as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                if measured:
+                    recorder.record(operation, time.perf_counter() - started, error, limited)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        # In-flight requests finish after stop_at; count that tail in the elapsed time
+        elapsed = loop.time() - measure_from
+    return {"concurrency": concurrency, **recorder.summary(elapsed)}
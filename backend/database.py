@@ -1,27 +1,284 @@
+import asyncio
 import sqlite3
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Sequence
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DB_PATH = os.getenv("SQLITE_DB_PATH", "app.db")
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# Connection pool configuration
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("SQLITE_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
+
+class ConnectionPool:
+    """Fixed-size pool of long-lived, pre-tuned SQLite connections.
+
+    Connections are opened lazily up to ``size`` and then reused; callers
+    block (up to ``timeout`` seconds) when every connection is checked out.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._hits = 0
+        self._waits = 0
+        self._checkouts = 0
+        self._checkout_time = 0.0
+        self._max_checkout_time = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+            hit, waited = True, False
+        except queue.Empty:
+            with self._lock:
+                if self._opened < self.size:
+                    self._opened += 1
+                    hit, waited = False, False
+                else:
+                    hit, waited = False, True
+            if waited:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No SQLite connection available after {self.timeout}s")
+            else:
+                try:
+                    conn = _open_connection()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            self._hits += hit
+            self._waits += waited
+            self._checkout_time += elapsed
+            self._max_checkout_time = max(self._max_checkout_time, elapsed)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def discard(self, conn: sqlite3.Connection):
+        """Drop a connection that is in an unknown state instead of reusing it."""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._opened -= 1
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "hits": self._hits,
+                "waits": self._waits,
+                "checkout_time_total": self._checkout_time,
+                "checkout_time_max": self._max_checkout_time,
+            }
+
+
+pool = ConnectionPool()
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_sqlite.sql")
+
+# Columns added after a table was first created. CREATE TABLE IF NOT EXISTS
+# won't add them to an existing database, so init_db does it explicitly.
+ADDED_COLUMNS = {
+    "providers": {
+        "sa_front_id": "TEXT",
+        "sa_back_id": "TEXT",
+        "profile_photo": "TEXT",
+        "profile_photo_thumb": "TEXT",
+        "profile_photo_medium": "TEXT",
+        "change_seq": "INTEGER",
+        "rating_sum": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+
+def _add_missing_columns(conn):
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not existing:
+            continue
+        for column, column_type in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def init_db():
+    """Apply schema_sqlite.sql; every statement in it is idempotent."""
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    with get_db_connection() as conn:
+        _add_missing_columns(conn)
+        fts_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'providers_fts'"
+        ).fetchone()
+        conn.executescript(schema)
+        if not fts_exists:
+            # Index rows that predate the full-text table and its triggers
+            conn.execute("INSERT INTO providers_fts (providers_fts) VALUES ('rebuild')")
+
+
+@contextmanager
+def get_db_connection():
+    """Check out a pooled connection, committing on success and rolling back on error."""
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except sqlite3.Error:
+        if _is_usable(conn):
+            pool.release(conn)
+        else:
+            pool.discard(conn)
+        raise
+    except BaseException:
+        pool.release(conn)
+        raise
+    else:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    """Pooled connection inside an explicit write transaction (BEGIN IMMEDIATE).
+
+    Takes the write lock up front so reads inside the block can't go stale
+    before the writes that depend on them.
+    """
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield TracedConnection(conn)
+
+
+def _is_usable(conn: sqlite3.Connection) -> bool:
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("SELECT 1")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+# Called as hook(query, params, seconds, rows) after every execute_query and
+# execute_query_one, on the thread that ran the statement. ``seconds`` covers
+# execute, fetch and commit but not the wait for a pooled connection; ``rows``
+# is the number fetched for reads and the affected count for writes.
+query_hooks = []
+
+
+def add_query_hook(hook):
+    if hook not in query_hooks:
+        query_hooks.append(hook)
+
+
+def _run_query_hooks(query, params, seconds, rows):
+    for hook in query_hooks:
+        hook(query, params, seconds, rows)
+
+
+class TracedConnection:
+    """A connection whose ``execute``/``executemany`` calls also run the query hooks.
+
+    Handed to ``func(conn, ...)`` callbacks (``transaction()``, ``UnitOfWork.run``
+    and the group-commit writer), which fetch their own results: ``seconds``
+    covers the execute call (a write runs to completion, a read steps to its
+    first row) and ``rows`` is the affected count for writes and 0 for reads.
+    """
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def execute(self, query, params=()):
+        start = time.perf_counter()
+        cur = self._conn.execute(query, params)
+        if query_hooks:
+            _run_query_hooks(query, params, time.perf_counter() - start, max(cur.rowcount, 0))
+        return cur
+
+    def executemany(self, query, seq_of_params):
+        start = time.perf_counter()
+        cur = self._conn.executemany(query, seq_of_params)
+        if query_hooks:
+            _run_query_hooks(query, None, time.perf_counter() - start, max(cur.rowcount, 0))
+        return cur
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def call_traced(conn: sqlite3.Connection, func, *args):
+    """``func(conn, *args)`` with ``conn`` wrapped so its statements reach the query hooks."""
+    return func(TracedConnection(conn), *args)
+
+
 def execute_query(query, params=None):
     with get_db_connection() as conn:
+        start = time.perf_counter()
         cur = conn.cursor()
         cur.execute(query, params or ())
         if query.strip().upper().startswith('SELECT'):
-            return [dict(row) for row in cur.fetchall()]
-        conn.commit()
-        return None
+            result = [dict(row) for row in cur.fetchall()]
+            rows = len(result)
+        else:
+            result = None
+            rows = cur.rowcount
+    if query_hooks:
+        _run_query_hooks(query, params, time.perf_counter() - start, rows)
+    return result
 
 def execute_query_one(query, params=None):
     with get_db_connection() as conn:
+        start = time.perf_counter()
         cur = conn.cursor()
         cur.execute(query, params or ())
         # Fetch result before commit for SELECT, INSERT, UPDATE, and DELETE (with RETURNING)
@@ -32,7 +289,219 @@ def execute_query_one(query, params=None):
             query.strip().upper().startswith('DELETE')
         ):
             row = cur.fetchone()
-            conn.commit()
-            return dict(row) if row else None
-        conn.commit()
-        return None 
\ No newline at end of file
+            result = dict(row) if row else None
+            rows = 1 if row else 0
+        else:
+            result = None
+            rows = cur.rowcount
+    if query_hooks:
+        _run_query_hooks(query, params, time.perf_counter() - start, rows)
+    return result
+
+
+# Async API: statements run on a dedicated executor sized to the pool so that
+# disk I/O never blocks the event loop and never competes with the default
+# threadpool FastAPI uses for sync endpoints.
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="sqlite")
+
+
+async def run_in_db_executor(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def execute_query_async(query, params=None):
+    return await run_in_db_executor(execute_query, query, params)
+
+
+async def execute_query_one_async(query, params=None):
+    return await run_in_db_executor(execute_query_one, query, params)
+
+
+async def run_in_transaction_async(func, *args):
+    """Run ``func(conn, *args)`` inside transaction() on the database executor."""
+
+    def run():
+        with transaction() as conn:
+            return func(conn, *args)
+
+    return await run_in_db_executor(run)
+
+
+async def stream_keyset_async(
+    table: str, columns: str, key: Sequence[str], where: str = "", params=(), batch_size=500,
+    after: Optional[tuple] = None,
+):
+    """Yield lists of row dicts from ``table`` in ``key`` order (past ``after``), ``batch_size`` rows at a time.
+
+    Every batch is its own short query that seeks past the last key yielded,
+    so no pooled connection (or read snapshot holding back WAL checkpoints) is
+    kept while the consumer is slow. ``key`` must be unique, indexed and among
+    ``columns``. Rows are read as of their batch: one that changes mid-stream is
+    seen in its latest state, or not at all if its key moved behind the cursor.
+    """
+    key_list = ", ".join(key)
+    seek = f"({key_list}) > ({', '.join('?' for _ in key)})"
+    last = after
+    while True:
+        conditions = [where] if where else []
+        args = list(params)
+        if last is not None:
+            conditions.append(seek)
+            args.extend(last)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = await execute_query_async(
+            f"SELECT {columns} FROM {table} {where_clause} ORDER BY {key_list} LIMIT ?", (*args, batch_size)
+        )
+        if not rows:
+            return
+        # Before yielding: the consumer may rewrite the rows
+        last = tuple(rows[-1][column] for column in key)
+        yield rows
+        if len(rows) < batch_size:
+            return
+
+
+# Units of work hold the write lock across awaits, so they take turns behind an
+# asyncio.Lock and run on their own thread: a request holding BEGIN IMMEDIATE
+# never waits for a free executor thread, and requests waiting for it wait on
+# the event loop instead of parking executor threads in busy_timeout.
+_uow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-uow")
+_uow_locks = {}
+
+
+def _uow_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _uow_locks.get(loop)
+    if lock is None:
+        _uow_locks.clear()
+        lock = _uow_locks[loop] = asyncio.Lock()
+    return lock
+
+
+def _release_abandoned(future):
+    if not future.cancelled() and future.exception() is None:
+        pool.release(future.result())
+
+
+class UnitOfWork:
+    """One pooled connection and one write transaction shared by a request.
+
+    Every ``execute``/``execute_one``/``run`` call goes through the same
+    connection; the first one waits its turn for the process's unit-of-work
+    lock, checks a connection out and issues BEGIN IMMEDIATE, so a read
+    followed by a dependent write can't race another writer. Statements run on
+    a dedicated thread that only the lock holder uses. Nothing is visible to
+    other connections until ``commit()``, which also runs the callbacks
+    registered with ``after_commit`` (cache invalidation, so caches never
+    re-fill from the pre-commit row). A unit of work that is never committed is
+    rolled back by ``close()``.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._lock = None
+        self._after_commit = []
+
+    def _begin(self) -> sqlite3.Connection:
+        conn = pool.acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            pool.release(conn)
+            raise
+        return conn
+
+    async def _call(self, func, *args):
+        # Runs func(conn, *args) on the unit-of-work thread, starting the transaction first if needed
+        if self._conn is None:
+            lock = _uow_lock()
+            await lock.acquire()
+            begin = asyncio.get_running_loop().run_in_executor(_uow_executor, self._begin)
+            try:
+                self._conn = await begin
+            except BaseException:
+                # Cancelled mid-BEGIN: give the connection back once it is done
+                begin.add_done_callback(_release_abandoned)
+                lock.release()
+                raise
+            self._lock = lock
+        return await asyncio.get_running_loop().run_in_executor(_uow_executor, func, self._conn, *args)
+
+    async def run(self, func, *args):
+        """Run ``func(conn, *args)`` inside the shared transaction."""
+        return await self._call(call_traced, func, *args)
+
+    def _execute(self, conn: sqlite3.Connection, query, params, fetch_one: bool):
+        start = time.perf_counter()
+        cur = conn.execute(query, params or ())
+        if fetch_one:
+            row = cur.fetchone()
+            result = dict(row) if row else None
+            rows = 1 if row else 0
+        else:
+            result = [dict(row) for row in cur.fetchall()]
+            rows = len(result) if cur.description else cur.rowcount
+        if query_hooks:
+            _run_query_hooks(query, params, time.perf_counter() - start, rows)
+        return result
+
+    async def execute(self, query, params=None) -> list:
+        """All rows the statement returns (SELECT, or any write with RETURNING)."""
+        return await self._call(self._execute, query, params, False)
+
+    async def execute_one(self, query, params=None):
+        """The first row the statement returns, or None."""
+        return await self._call(self._execute, query, params, True)
+
+    def after_commit(self, func, *args):
+        self._after_commit.append((func, args))
+
+    def _finish(self, conn: sqlite3.Connection, commit: bool):
+        try:
+            if commit:
+                conn.commit()
+            else:
+                conn.rollback()
+        except sqlite3.Error:
+            if _is_usable(conn):
+                pool.release(conn)
+            else:
+                pool.discard(conn)
+            raise
+        pool.release(conn)
+
+    async def _end(self, commit: bool):
+        conn, self._conn = self._conn, None
+        lock, self._lock = self._lock, None
+        if conn is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(_uow_executor, self._finish, conn, commit)
+        finally:
+            lock.release()
+
+    async def commit(self):
+        await self._end(True)
+        callbacks, self._after_commit = self._after_commit, []
+        for func, args in callbacks:
+            func(*args)
+
+    async def close(self):
+        """Roll back anything not yet committed and return the connection to the pool."""
+        self._after_commit = []
+        await self._end(False)
+
+
+async def get_unit_of_work():
+    """FastAPI dependency yielding a UnitOfWork for the request.
+
+    FastAPI runs dependency teardown after the response has been sent, so
+    routes must ``await uow.commit()`` themselves before returning; teardown
+    only rolls back whatever was left uncommitted.
+    """
+    uow = UnitOfWork()
+    try:
+        yield uow
+    finally:
+        await uow.close()
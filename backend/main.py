@@ -1,9 +1,25 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from modules.users.routes import router as users_router
 from modules.providers.routes import router as providers_router
+from modules.reviews.routes import router as reviews_router
+from modules.providers.service import TOMBSTONE_PURGE_INTERVAL_SECONDS, purge_tombstones
+from modules.providers.index import PROVIDER_INDEX_REFRESH_SECONDS, provider_index
+from modules.reviews.service import REVIEW_CHECK_INTERVAL_SECONDS, check_aggregates
+from database import init_db, run_in_db_executor
+from modules.passwords import hasher
+from modules.blobstore import UPLOAD_DIR
+from modules import blobstore, images, tokens
+from modules.static import CachedStaticFiles
+from modules.uploads import MultipartSizeLimitMiddleware
+from modules import metrics
+from modules.writer import writer
+from modules.auth import require_admin
+from modules.querylog import QUERY_DIAGNOSTICS, SLOW_QUERY_MS, SORT_KEYS, query_log
+from modules.utils import run_periodically
 import uvicorn
+import asyncio
+import logging
 
 app = FastAPI(title="Service Marketplace API")
 
@@ -14,13 +30,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
+app.add_middleware(MultipartSizeLimitMiddleware)
+app.add_middleware(metrics.MetricsMiddleware, routes=app.routes)
+
+@app.on_event("startup")
+async def start():
+    init_db()
+    app.state.periodic_tasks = [
+        asyncio.create_task(run_periodically(
+            blobstore.sweep, blobstore.BLOB_GC_INTERVAL_SECONDS, "Blob sweep",
+            "Removed %d unreferenced blobs")),
+        asyncio.create_task(run_periodically(
+            tokens.purge_expired, tokens.REFRESH_TOKEN_PURGE_INTERVAL_SECONDS, "Refresh token purge",
+            "Purged %d refresh tokens")),
+        asyncio.create_task(run_periodically(
+            purge_tombstones, TOMBSTONE_PURGE_INTERVAL_SECONDS, "Provider tombstone purge",
+            "Purged %d provider tombstones")),
+        asyncio.create_task(run_periodically(
+            check_aggregates, REVIEW_CHECK_INTERVAL_SECONDS, "Review consistency check",
+            "Review consistency check repaired %d providers", level=logging.WARNING)),
+    ]
+    if provider_index.enabled:
+        app.state.periodic_tasks.append(asyncio.create_task(run_periodically(
+            provider_index.refresh, PROVIDER_INDEX_REFRESH_SECONDS, "Provider index refresh", immediately=True)))
+
+@app.on_event("shutdown")
+def stop_workers():
+    for task in getattr(app.state, "periodic_tasks", []):
+        task.cancel()
+    hasher.shutdown()
+    images.shutdown()
+    writer.stop()
 
 # Include routers
 app.include_router(users_router, prefix="/api/users", tags=["users"])
 app.include_router(providers_router, prefix="/api/providers", tags=["providers"])
+app.include_router(reviews_router, prefix="/api/reviews", tags=["reviews"])
+
+app.mount("/uploaded_images", CachedStaticFiles(directory=UPLOAD_DIR), name="uploaded_images")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/queries", dependencies=[Depends(require_admin)], include_in_schema=False)
+async def slowest_queries(
+    limit: int = Query(20, ge=1, le=500),
+    sort: str = Query("total", enum=list(SORT_KEYS)),
+    explain: bool = False,
+):
+    """Top statements by total/max/mean time or count (needs QUERY_DIAGNOSTICS=1)"""
+    try:
+        statements = await run_in_db_executor(query_log.top, limit, sort, explain)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"enabled": QUERY_DIAGNOSTICS, "slow_query_ms": SLOW_QUERY_MS, "statements": statements}
+
+@app.delete("/debug/queries", status_code=204, dependencies=[Depends(require_admin)], include_in_schema=False)
+async def reset_query_stats():
+    query_log.reset()
 
-app.mount("/uploaded_images", StaticFiles(directory="uploaded_images"), name="uploaded_images")
+@app.get("/debug/provider-index", dependencies=[Depends(require_admin)], include_in_schema=False)
+async def provider_index_stats():
+    """Rows and memory footprint of the in-memory provider index (needs PROVIDER_INDEX=1)"""
+    return provider_index.stats()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,241 @@
+"""Admission control for the bcrypt-backed auth endpoints.
+
+Login and registration each cost a bcrypt hash, so a burst of credential
+stuffing can take every core away from the cheap browsing routes. Three
+limits sit in front of those handlers:
+
+* a token bucket per client IP (``AUTH_IP_RATE_PER_MINUTE``, ``AUTH_IP_BURST``);
+* a token bucket per login account (``AUTH_ACCOUNT_RATE_PER_MINUTE``,
+  ``AUTH_ACCOUNT_BURST``), so one account can't be hammered from many IPs.
+  Registration has no account bucket: registering an existing email fails
+  before any hashing;
+* a process-wide cap of ``AUTH_MAX_CONCURRENCY`` handlers running at once.
+  At most ``AUTH_MAX_QUEUE`` more wait, for up to ``AUTH_QUEUE_TIMEOUT_SECONDS``.
+
+An exhausted bucket answers ``429`` and a full or timed-out queue ``503``,
+both with ``Retry-After``, before any hashing is done. Buckets are kept in
+LRU-bounded maps (``AUTH_BUCKETS_MAX_ENTRIES`` keys each). An evicted key
+simply starts again with a full bucket. A rate of ``0`` disables a bucket.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Hashable, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from . import metrics
+from .passwords import PASSWORD_HASH_WORKERS
+
+AUTH_IP_RATE_PER_MINUTE = float(os.getenv("AUTH_IP_RATE_PER_MINUTE", "30"))
+AUTH_IP_BURST = int(os.getenv("AUTH_IP_BURST", "10"))
+AUTH_ACCOUNT_RATE_PER_MINUTE = float(os.getenv("AUTH_ACCOUNT_RATE_PER_MINUTE", "6"))
+AUTH_ACCOUNT_BURST = int(os.getenv("AUTH_ACCOUNT_BURST", "5"))
+AUTH_BUCKETS_MAX_ENTRIES = int(os.getenv("AUTH_BUCKETS_MAX_ENTRIES", "100000"))
+AUTH_MAX_CONCURRENCY = int(os.getenv("AUTH_MAX_CONCURRENCY", str(PASSWORD_HASH_WORKERS * 2)))
+AUTH_MAX_QUEUE = int(os.getenv("AUTH_MAX_QUEUE", "32"))
+AUTH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AUTH_QUEUE_TIMEOUT_SECONDS", "2"))
+# Only behind a reverse proxy that sets it: otherwise clients pick their own IP
+AUTH_TRUST_FORWARDED_FOR = os.getenv("AUTH_TRUST_FORWARDED_FOR", "0").lower() in ("1", "true", "yes")
+
+admission_rejections = metrics.registry.counter(
+    "admission_rejections_total", "Auth requests turned away by admission control.", ("limiter",))
+admission_wait = metrics.registry.histogram(
+    "admission_wait_seconds", "Time auth requests waited for a concurrency slot.", ("limiter",))
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by client, refilled at ``rate`` tokens per second up to ``burst``."""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, maxsize: int = AUTH_BUCKETS_MAX_ENTRIES):
+        self.name = name
+        self.rate = rate_per_minute / 60
+        self.burst = max(burst, 1)
+        self.maxsize = maxsize
+        # key -> (tokens, monotonic time of last update), least recently used first
+        self._buckets: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._allowed = 0
+        self._limited = 0
+        self._evictions = 0
+
+    def acquire(self, key: Hashable) -> float:
+        """Take a token for ``key``: 0 if allowed, else seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None:
+                tokens = float(self.burst)
+            else:
+                tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+                self._allowed += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self._limited += 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+                self._evictions += 1
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._buckets),
+                "maxsize": self.maxsize,
+                "rate_per_minute": self.rate * 60,
+                "burst": self.burst,
+                "allowed": self._allowed,
+                "limited": self._limited,
+                "evictions": self._evictions,
+            }
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` holders at once, and at most ``max_queue`` waiting for a slot.
+
+    Must be used from the event loop thread; the counters are not locked.
+    """
+
+    def __init__(self, name: str, limit: int = AUTH_MAX_CONCURRENCY, max_queue: int = AUTH_MAX_QUEUE,
+                 timeout: float = AUTH_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._active = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    async def acquire(self):
+        """Wait for a slot; raises Overloaded when the queue is full or the wait times out."""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise Overloaded()
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise Overloaded()
+        finally:
+            self._waiting -= 1
+        admission_wait.observe(self.name, value=time.perf_counter() - start)
+        self._active += 1
+
+    def release(self):
+        self._active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+        }
+
+
+ip_limiter = TokenBucketLimiter("ip", AUTH_IP_RATE_PER_MINUTE, AUTH_IP_BURST)
+account_limiter = TokenBucketLimiter("account", AUTH_ACCOUNT_RATE_PER_MINUTE, AUTH_ACCOUNT_BURST)
+auth_slots = ConcurrencyLimiter("auth")
+
+
+def _samples():
+    buckets = [ip_limiter.stats(), account_limiter.stats()]
+    slots = auth_slots.stats()
+    yield "admission_buckets", "gauge", "Token buckets currently tracked by limiter.", [
+        ({"limiter": stats["name"]}, stats["size"]) for stats in buckets
+    ]
+    yield "admission_bucket_evictions_total", "counter", "Token buckets evicted to stay within the size bound.", [
+        ({"limiter": stats["name"]}, stats["evictions"]) for stats in buckets
+    ]
+    yield "admission_in_flight", "gauge", "Auth requests holding a concurrency slot.", [
+        ({"limiter": slots["name"]}, slots["active"])
+    ]
+    yield "admission_queue_depth", "gauge", "Auth requests waiting for a concurrency slot.", [
+        ({"limiter": slots["name"]}, slots["waiting"])
+    ]
+
+
+metrics.registry.add_collector(_samples)
+
+
+def client_ip(request: Request) -> str:
+    if AUTH_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _too_many_requests(limiter: str, wait: float) -> HTTPException:
+    admission_rejections.inc(limiter)
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many attempts, please retry later",
+        headers={"Retry-After": str(max(math.ceil(wait), 1))},
+    )
+
+
+@asynccontextmanager
+async def _admit(request: Request, account: Optional[str]):
+    wait = ip_limiter.acquire(client_ip(request))
+    if wait:
+        raise _too_many_requests(ip_limiter.name, wait)
+    if account is not None:
+        wait = account_limiter.acquire(account.strip().lower())
+        if wait:
+            raise _too_many_requests(account_limiter.name, wait)
+    try:
+        await auth_slots.acquire()
+    except Overloaded:
+        admission_rejections.inc(auth_slots.name)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(max(math.ceil(auth_slots.timeout), 1))},
+        )
+    try:
+        yield
+    finally:
+        auth_slots.release()
+
+
+async def admit_registration(request: Request):
+    """Dependency for register routes: IP bucket and concurrency slot."""
+    async with _admit(request, None):
+        yield
+
+
+async def admit_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    """Dependency for login routes: IP and account buckets and concurrency slot.
+
+    Shares the (cached) form dependency with the route, so the body is parsed once.
+    """
+    async with _admit(request, form_data.username):
+        yield
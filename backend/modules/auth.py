@@ -0,0 +1,151 @@
+import hmac
+import os
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from dotenv import load_dotenv
+from database import execute_query_one_async
+from .cache import TTLCache
+
+load_dotenv()
+
+# Shared secret for operator-only endpoints (bulk export/import); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# JWT configuration, for signing (create_access_token) and verifying (decode_token)
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+class Principal(NamedTuple):
+    """The authenticated account behind a request."""
+    id: str
+    type: str  # "customer" or "provider"
+    email: str
+    is_active: bool
+
+
+# user_type claim -> (table, claim holding the account id)
+ACCOUNT_TYPES = {
+    "customer": ("users", "user_id"),
+    "provider": ("providers", "provider_id"),
+}
+
+# token -> verified claims, kept until the token's own exp
+claims_cache = TTLCache("token_claims")
+# (user_type, id) -> Principal; invalidated when the account changes
+principal_cache = TTLCache("principals")
+
+
+def invalidate_principal(user_type: str, principal_id: str):
+    principal_cache.invalidate((user_type, principal_id))
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """Verified claims of a signed, unexpired token, or None."""
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims if claims["exp"] > time.time() else None
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if claims.get("user_type") not in ACCOUNT_TYPES or not isinstance(claims.get("exp"), (int, float)):
+        return None
+    claims_cache.set(token, claims, ttl=claims["exp"] - time.time())
+    return claims
+
+
+async def load_principal(user_type: str, principal_id: Optional[str], email: Optional[str] = None) -> Optional[Principal]:
+    """Principal by id (cached), or by email for tokens minted without an id claim."""
+    table, _ = ACCOUNT_TYPES[user_type]
+    generation = principal_cache.generation()
+    if principal_id:
+        principal = principal_cache.get((user_type, principal_id))
+        if principal is not None:
+            return principal
+        row = await execute_query_one_async(
+            f"SELECT id, email, is_active FROM {table} WHERE id = ?", (principal_id,)
+        )
+    elif email:
+        row = await execute_query_one_async(
+            f"SELECT id, email, is_active FROM {table} WHERE email = ?", (email,)
+        )
+    else:
+        return None
+    if not row:
+        return None
+    principal = Principal(row["id"], user_type, row["email"], bool(row["is_active"]))
+    principal_cache.set((user_type, principal.id), principal, generation=generation)
+    return principal
+
+
+def _unauthorized(detail: str = "Invalid authentication credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def authenticate(token: str) -> Principal:
+    """Resolve a bearer token to an active principal; raises 401 otherwise.
+
+    With warm caches this is two dict lookups and no JWT decode or SQLite query.
+    """
+    claims = decode_token(token)
+    if claims is None:
+        raise _unauthorized()
+    user_type = claims["user_type"]
+    _, id_claim = ACCOUNT_TYPES[user_type]
+    principal = await load_principal(user_type, claims.get(id_claim), claims.get("sub"))
+    if principal is None:
+        raise _unauthorized()
+    if not principal.is_active:
+        raise _unauthorized("Account is inactive")
+    return principal
+
+
+async def get_current_principal(token: Optional[str] = Depends(oauth2_scheme)) -> Principal:
+    if not token:
+        raise _unauthorized("Not authenticated")
+    return await authenticate(token)
+
+
+async def get_optional_principal(token: Optional[str] = Depends(oauth2_scheme)) -> Optional[Principal]:
+    """Like get_current_principal, but None when no bearer token was sent."""
+    return await authenticate(token) if token else None
+
+
+def require_principal(user_type: str):
+    """Dependency factory: the current principal, which must be of ``user_type``."""
+
+    async def dependency(principal: Principal = Depends(get_current_principal)) -> Principal:
+        if principal.type != user_type:
+            raise _unauthorized()
+        return principal
+
+    return dependency
@@ -0,0 +1,126 @@
+"""Content-addressed storage for uploaded files.
+
+Each blob is stored once at ``blobs/<aa>/<bb>/<sha256><ext>`` under UPLOAD_DIR and
+has a row in the ``blobs`` table whose ``refcount`` counts the provider image
+columns that point at it. Derived files (image variants) live next to their
+blob as ``<sha256>.<variant>.<ext>`` and are removed together with it.
+"""
+import glob
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+from fastapi.concurrency import run_in_threadpool
+from database import execute_query, transaction
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploaded_images")
+UPLOAD_URL_PREFIX = "/uploaded_images"
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+# Unreferenced blobs younger than this are kept, so an upload isn't reclaimed
+# in the window between being stored and being attached to a provider
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+BLOB_GC_INTERVAL_SECONDS = int(os.getenv("BLOB_GC_INTERVAL_SECONDS", "3600"))
+
+_BLOB_URL = re.compile(
+    re.escape(UPLOAD_URL_PREFIX) + r"/blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z0-9]+$"
+)
+
+
+# Serializes storing against sweeping within this process
+_lock = threading.Lock()
+
+os.makedirs(BLOB_DIR, exist_ok=True)
+
+
+def upload_path(url: Optional[str]) -> Optional[str]:
+    """Filesystem path for a URL under UPLOAD_URL_PREFIX, or None for foreign URLs."""
+    if not url or not url.startswith(UPLOAD_URL_PREFIX + "/"):
+        return None
+    relative = url[len(UPLOAD_URL_PREFIX) + 1:]
+    if os.path.isabs(relative) or ".." in relative.split("/"):
+        return None
+    return os.path.join(UPLOAD_DIR, relative)
+
+
+def upload_url(path: str) -> str:
+    relative = os.path.relpath(path, UPLOAD_DIR).replace(os.sep, "/")
+    return f"{UPLOAD_URL_PREFIX}/{relative}"
+
+
+def blob_path(digest: str, extension: str) -> str:
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], f"{digest}{extension}")
+
+
+def blob_digest(url: Optional[str]) -> Optional[str]:
+    """SHA-256 of the blob a URL points at, or None if it isn't a blob URL."""
+    match = _BLOB_URL.match(url or "")
+    return match.group(1) if match else None
+
+
+def _store(tmp_path: str, digest: str, extension: str, size: int) -> str:
+    destination = blob_path(digest, extension)
+    url = upload_url(destination)
+    now = datetime.utcnow()
+    with _lock:
+        # Touch the row first so a concurrent sweep sees the blob as fresh
+        execute_query(
+            """
+            INSERT INTO blobs (digest, url, size, refcount, created_at, updated_at)
+            VALUES (?, ?, ?, 0, ?, ?)
+            ON CONFLICT (digest) DO UPDATE SET updated_at = excluded.updated_at
+            """,
+            (digest, url, size, now, now),
+        )
+        if os.path.exists(destination):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(tmp_path, destination)
+    return url
+
+
+async def store(tmp_path: str, digest: str, extension: str, size: int) -> str:
+    """Move a fully written temp file into the store and return its URL.
+
+    If a blob with the same digest already exists the temp file is discarded.
+    ``tmp_path`` must be on the same filesystem as BLOB_DIR.
+    """
+    return await run_in_threadpool(_store, tmp_path, digest, extension, size)
+
+
+def replace_refs(conn, old_urls: Iterable[Optional[str]], new_urls: Iterable[Optional[str]]):
+    """Move references from ``old_urls`` to ``new_urls`` within the caller's transaction."""
+    old = Counter(d for d in map(blob_digest, old_urls) if d)
+    new = Counter(d for d in map(blob_digest, new_urls) if d)
+    now = datetime.utcnow()
+    for digest in old | new:
+        delta = new[digest] - old[digest]
+        if delta:
+            conn.execute(
+                "UPDATE blobs SET refcount = refcount + ?, updated_at = ? WHERE digest = ?",
+                (delta, now, digest),
+            )
+
+
+def sweep(grace_seconds: int = BLOB_GC_GRACE_SECONDS) -> int:
+    """Delete blobs (and their derived files) that nothing has referenced for ``grace_seconds``."""
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    with _lock:
+        with transaction() as conn:
+            rows = conn.execute(
+                "DELETE FROM blobs WHERE refcount <= 0 AND updated_at < ? RETURNING url",
+                (cutoff,),
+            ).fetchall()
+        for row in rows:
+            path = upload_path(row["url"])
+            if path is None:
+                continue
+            stem, _ = os.path.splitext(path)
+            for leftover in glob.glob(glob.escape(stem) + ".*"):
+                try:
+                    os.unlink(leftover)
+                except FileNotFoundError:
+                    pass
+    return len(rows)
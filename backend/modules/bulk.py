@@ -0,0 +1,199 @@
+"""NDJSON bulk export and import shared by the providers and users modules."""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Sequence, Tuple, Type
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from database import run_in_transaction_async, stream_keyset_async
+from .passwords import get_password_hash, hasher
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+# Per-row errors beyond this are counted but not listed in the report
+MAX_REPORTED_ERRORS = 1000
+
+_BCRYPT_HASH = re.compile(r"^\$2[abxy]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+
+async def export_ndjson(
+    table: str, columns: Sequence[str], bool_columns: Iterable[str] = ()
+) -> AsyncIterator[str]:
+    """Yield ``columns`` of every row in ``table`` as NDJSON text, oldest first, one chunk per batch.
+
+    Batches seek on the (created_at, id) page index, so a slow client holds no
+    connection between them.
+    """
+    bool_columns = tuple(bool_columns)
+    batches = stream_keyset_async(table, ", ".join(columns), ("created_at", "id"), batch_size=EXPORT_BATCH_SIZE)
+    async for rows in batches:
+        lines = []
+        for row in rows:
+            for column in bool_columns:
+                if row.get(column) is not None:
+                    row[column] = bool(row[column])
+            lines.append(json.dumps(row, default=str, separators=(",", ":")))
+        yield "\n".join(lines) + "\n"
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, parsed object or ValueError) for each non-blank line."""
+    buffer = b""
+    line_no = 0
+
+    def parse(line: bytes):
+        try:
+            return json.loads(line)
+        except ValueError as exc:
+            return ValueError(f"Invalid JSON: {exc}")
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, parse(line)
+    if buffer.strip():
+        yield line_no + 1, parse(buffer)
+
+
+def _utc_naive(value: datetime) -> datetime:
+    # Stored timestamps are naive UTC; keep imported ones comparable with them
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _insert_batch(conn, query: str, batch: List[Tuple[int, tuple]]) -> List[Tuple[int, str]]:
+    """executemany the batch; if any row fails, redo it row by row to report which."""
+    conn.execute("SAVEPOINT import_batch")
+    try:
+        conn.executemany(query, [values for _, values in batch])
+        conn.execute("RELEASE import_batch")
+        return []
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO import_batch")
+        conn.execute("RELEASE import_batch")
+    errors = []
+    for line_no, values in batch:
+        try:
+            conn.execute(query, values)
+        except sqlite3.Error as exc:
+            errors.append((line_no, str(exc)))
+    return errors
+
+
+def _write_batch(conn, query: str, batch: List[Tuple[int, tuple]], table: str, email_at: int):
+    """Insert the batch; its errors and the stored ids of the rows written (upserts keep the old id)."""
+    errors = _insert_batch(conn, query, batch)
+    failed = {line_no for line_no, _ in errors}
+    emails = [values[email_at] for line_no, values in batch if line_no not in failed]
+    ids = [row["id"] for row in conn.execute(
+        f"SELECT id FROM {table} WHERE email IN ({', '.join('?' for _ in emails)})", emails
+    )] if emails else []
+    return errors, ids
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line_no: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": error})
+
+    def as_dict(self) -> dict:
+        errors = sorted(self.errors, key=lambda error: error["line"])
+        return {"imported": self.imported, "failed": self.failed, "errors": errors}
+
+
+async def import_ndjson(
+    chunks: AsyncIterator[bytes],
+    model: Type[BaseModel],
+    table: str,
+    columns: Sequence[str],
+    upsert: bool = False,
+    on_written: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """Validate NDJSON records against ``model`` and insert them into ``table``.
+
+    Records are written ``IMPORT_BATCH_SIZE`` at a time, one transaction per
+    batch. ``id``, ``created_at`` and ``updated_at`` are filled in when absent,
+    and passwords that aren't already bcrypt hashes are hashed. With
+    ``upsert`` an existing row with the same email is updated in place.
+    ``on_written`` is called with the stored id of every row written, once its
+    batch has committed, so callers can drop cached copies.
+
+    A record whose password can't be hashed because the hasher is overloaded
+    fails on its own line; the rest of the import carries on.
+    """
+    placeholders = ", ".join("?" for _ in columns)
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    if upsert:
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in ("id", "email", "created_at"))
+        query += f" ON CONFLICT (email) DO UPDATE SET {updates}"
+
+    report = ImportReport()
+    hash_slots = asyncio.Semaphore(hasher.workers)
+
+    async def prepare(record: BaseModel) -> Tuple[Optional[tuple], Optional[str]]:
+        data = record.model_dump()
+        now = datetime.utcnow()
+        data["id"] = data.get("id") or str(uuid.uuid4())
+        for field in ("created_at", "updated_at"):
+            data[field] = _utc_naive(data[field]) if data.get(field) else now
+        if not _BCRYPT_HASH.match(data["password"]):
+            async with hash_slots:
+                try:
+                    data["password"] = await get_password_hash(data["password"])
+                except HTTPException as exc:  # the hasher's 503 when its queue is full
+                    return None, f"Password hashing unavailable: {exc.detail}"
+        return tuple(data[column] for column in columns), None
+
+    async def flush(pending: List[Tuple[int, BaseModel]]):
+        prepared = await asyncio.gather(*(prepare(record) for _, record in pending))
+        batch = []
+        for (line_no, _), (values, error) in zip(pending, prepared):
+            if error:
+                report.fail(line_no, error)
+            else:
+                batch.append((line_no, values))
+        if not batch:
+            return
+        errors, ids = await run_in_transaction_async(_write_batch, query, batch, table, columns.index("email"))
+        for line_no, error in errors:
+            report.fail(line_no, error)
+        report.imported += len(batch) - len(errors)
+        if on_written:
+            for row_id in ids:
+                on_written(row_id)
+
+    pending = []
+    async for line_no, obj in iter_ndjson(chunks):
+        if isinstance(obj, Exception):
+            report.fail(line_no, str(obj))
+            continue
+        if not isinstance(obj, dict):
+            report.fail(line_no, "Expected a JSON object")
+            continue
+        try:
+            pending.append((line_no, model(**obj)))
+        except ValidationError as exc:
+            report.fail(line_no, "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors()
+            ))
+            continue
+        if len(pending) >= IMPORT_BATCH_SIZE:
+            await flush(pending)
+            pending = []
+    if pending:
+        await flush(pending)
+    return report.as_dict()
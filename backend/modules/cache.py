@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from . import metrics
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+# Every cache created in this process, for the metrics collector below
+_caches = []
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being set.
+
+    Cached values are shared between callers and must be treated as read-only.
+
+    A read-through loader takes ``generation()`` before reading the row and
+    passes it to ``set``. If the key was invalidated (or the cache cleared)
+    while the read was in flight, the value may predate that write and is not
+    cached. Invalidation stamps are kept for the last ``maxsize`` keys; an older
+    generation than that is treated as stale.
+    """
+
+    def __init__(self, name: str, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._generation = 0
+        # key -> generation of its last invalidation, oldest first
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        # Loads that started at or before this generation can't be checked any more
+        self._forgotten = 0
+        _caches.append(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def generation(self) -> int:
+        """Token for ``set``: take it before loading the value to be cached."""
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None):
+        """Cache ``value`` for ``ttl`` seconds (default: the cache's own ttl).
+
+        With ``generation``, nothing is cached if ``key`` has been invalidated since.
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and (
+                generation < self._forgotten or self._invalidated.get(key, 0) > generation
+            ):
+                return
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.maxsize, 1):
+                _, self._forgotten = self._invalidated.popitem(last=False)
+            if self._data.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._forgotten = self._generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+def _samples():
+    caches = [cache.stats() for cache in _caches]
+    yield "cache_entries", "gauge", "Entries held by each in-process cache.", [
+        ({"cache": stats["name"]}, stats["size"]) for stats in caches
+    ]
+    for key, documentation in (
+        ("hits", "Cache lookups that found a live entry."),
+        ("misses", "Cache lookups that found nothing or an expired entry."),
+        ("evictions", "Entries evicted to stay within the size bound."),
+        ("expirations", "Entries dropped because their TTL had passed."),
+        ("invalidations", "Entries removed because the underlying row changed."),
+    ):
+        yield f"cache_{key}_total", "counter", documentation, [
+            ({"cache": stats["name"]}, stats[key]) for stats in caches
+        ]
+
+
+metrics.registry.add_collector(_samples)
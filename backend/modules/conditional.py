@@ -0,0 +1,101 @@
+"""Conditional GET for API resources: weak ETags, Last-Modified and 304s.
+
+A single row's validator is its ``id`` and ``updated_at``. A list page's is the
+row count, the newest ``updated_at`` and the page's ids, so a row moving into
+or out of the page changes it as well. Routes check ``If-None-Match`` (or, for
+single rows, ``If-Modified-Since``) against validators read from a covering
+index and answer ``304`` without loading or serializing the rows.
+
+List pages ignore ``If-Modified-Since``: a deletion changes a page without
+making anything in it newer.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Union
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+# Clients may store responses but must revalidate before reusing them
+CACHE_CONTROL = "no-cache"
+
+Timestamp = Union[str, datetime]
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as required for If-None-Match
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
+
+
+def _as_datetime(value: Timestamp) -> datetime:
+    # Stored timestamps are naive UTC, as text ("YYYY-MM-DD HH:MM:SS[.ffffff]") or
+    # already parsed by a model
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def row_etag(row_id: str, updated_at: Timestamp) -> str:
+    return weak_etag(row_id, _as_datetime(updated_at).isoformat())
+
+
+def page_etag(rows: Iterable[dict]) -> str:
+    """ETag of a list page from its rows' ``id`` and ``updated_at``."""
+    ids = []
+    newest = None
+    for row in rows:
+        ids.append(row["id"])
+        updated_at = _as_datetime(row["updated_at"])
+        if newest is None or updated_at > newest:
+            newest = updated_at
+    return weak_etag(len(ids), newest.isoformat() if newest else "", *ids)
+
+
+def page_last_modified(rows: Iterable[dict]) -> Optional[datetime]:
+    return max((_as_datetime(row["updated_at"]) for row in rows), default=None)
+
+
+def validator_headers(etag: str, last_modified: Optional[Timestamp] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        last_modified = _as_datetime(last_modified).replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: Optional[Timestamp] = None) -> bool:
+    """Whether the client's copy is current. If-None-Match wins over If-Modified-Since."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        # HTTP dates have whole seconds
+        modified = _as_datetime(last_modified).replace(microsecond=0, tzinfo=timezone.utc)
+        return modified <= since
+    return False
+
+
+def has_conditions(request_headers: Headers) -> bool:
+    return "if-none-match" in request_headers or "if-modified-since" in request_headers
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
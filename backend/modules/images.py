@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+from PIL import Image, ImageOps
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+# Variant name -> bounding box; images are scaled down to fit, never up
+IMAGE_VARIANTS = {
+    "thumb": (200, 200),
+    "medium": (800, 800),
+}
+VARIANT_FORMAT = "WEBP"
+VARIANT_EXTENSION = ".webp"
+
+
+def variant_path(source_path: str, variant: str) -> str:
+    stem, _ = os.path.splitext(source_path)
+    return f"{stem}.{variant}{VARIANT_EXTENSION}"
+
+
+def render_variants(source_path: str) -> Dict[str, str]:
+    """Write every IMAGE_VARIANTS rendition of ``source_path`` next to it.
+
+    Runs in a worker process; returns variant name -> written file path.
+    """
+    written = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        for variant, size in IMAGE_VARIANTS.items():
+            rendition = image.copy()
+            rendition.thumbnail(size, Image.LANCZOS)
+            destination = variant_path(source_path, variant)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix=".variant-")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    rendition.save(out, VARIANT_FORMAT, quality=IMAGE_QUALITY, method=4)
+                os.replace(tmp_path, destination)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            written[variant] = destination
+    return written
+
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the parent runs DB and hashing threads that a fork would copy mid-flight
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def render_variants_async(source_path: str) -> Dict[str, str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), render_variants, source_path)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
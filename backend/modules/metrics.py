@@ -0,0 +1,267 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+A deliberately small registry (counters, gauges, histograms with fixed label
+names) rather than a client library: observing a value is a dict lookup and
+an increment under a lock, and rendering happens only when ``/metrics`` is
+scraped. Metrics are per process; with several uvicorn workers each one
+reports its own numbers, so scrape them individually or sum them downstream.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+import database
+
+# Starlette appends "; charset=utf-8" for text/ types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; covers cached reads (~1ms) through bcrypt and uploads (~1s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(value) for value in labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels: str, value: float):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, labels, state) -> List[str]:
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound if bound == float("inf") else float(bound))}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+        lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # Callables returning (name, kind, documentation, [(labels dict, value)])
+        # evaluated at scrape time, for numbers other components already keep
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        self._collectors.append(collector)
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status"))
+http_in_progress = registry.gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled.", ("method", "route"))
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.", ("method", "route"))
+
+db_query_latency = registry.histogram(
+    "db_query_duration_seconds", "execute_query/execute_query_one time by statement type.", ("statement",),
+    buckets=QUERY_BUCKETS)
+db_query_rows = registry.counter(
+    "db_query_rows_total", "Rows fetched (reads) or affected (writes) by statement type.", ("statement",))
+
+password_hash_latency = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt time per operation, excluding queueing.", ("operation",))
+password_hash_wait = registry.histogram(
+    "password_hash_wait_seconds", "Time password hash jobs waited for a worker.", ("operation",))
+
+upload_bytes = registry.histogram(
+    "upload_size_bytes", "Size of accepted uploads.", ("content_type",), buckets=BYTES_BUCKETS)
+upload_bytes_total = registry.counter(
+    "upload_bytes_total", "Bytes accepted across all uploads.", ("content_type",))
+
+_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def observe_query(query: str, params, seconds: float, rows: int):
+    verb = query.lstrip()[:6].upper()
+    statement = verb.lower() if verb in _STATEMENTS else "other"
+    db_query_latency.observe(statement, value=seconds)
+    if rows > 0:
+        db_query_rows.inc(statement, amount=rows)
+
+
+database.add_query_hook(observe_query)
+
+
+def _pool_samples():
+    stats = database.pool.stats()
+    yield "db_pool_connections", "gauge", "Connections in the SQLite pool by state.", [
+        ({"state": "open"}, stats["opened"]),
+        ({"state": "idle"}, stats["idle"]),
+    ]
+    yield "db_pool_checkouts_total", "counter", "Connections checked out of the pool.", [({}, stats["checkouts"])]
+    yield "db_pool_waits_total", "counter", "Checkouts that had to wait for a connection.", [({}, stats["waits"])]
+    yield "db_pool_checkout_wait_seconds_total", "counter", "Total time spent waiting for a connection.", [
+        ({}, stats["checkout_time_total"])
+    ]
+
+
+registry.add_collector(_pool_samples)
+
+
+class MetricsMiddleware:
+    """Records count, in-flight and latency per route template (``/api/providers/{provider_id}``).
+
+    The template is found by matching the request against ``routes`` the same
+    way the router will, so label cardinality is bounded by the route table;
+    requests that match nothing are labelled ``unmatched``.
+    """
+
+    def __init__(self, app: ASGIApp, routes: list):
+        self.app = app
+        self.routes = routes
+
+    def _route_template(self, scope: Scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_progress.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_latency.observe(method, route, value=time.perf_counter() - start)
+            http_in_progress.dec(method, route)
+            http_requests.inc(method, route, str(status_code))
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from . import metrics
+
+# bcrypt releases the GIL, so threads scale across cores; "process" isolates
+# hashing completely at the cost of pickling each call.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Hash jobs allowed to run or wait at once before callers get a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _timed(func, *args):
+    # Runs in the worker, so the time excludes queueing and works across processes
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated worker pool behind a bounded queue.
+
+    Must be used from the event loop thread; the pending counter is not locked.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_kind = executor
+        self._executor = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _get_executor(self):
+        # Created lazily so importing this module never forks worker processes
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _submit(self, operation: str, func, *args):
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            submitted = time.perf_counter()
+            result, seconds = await loop.run_in_executor(self._get_executor(), _timed, func, *args)
+            metrics.password_hash_latency.observe(operation, value=seconds)
+            metrics.password_hash_wait.observe(operation, value=max(time.perf_counter() - submitted - seconds, 0))
+            return result
+        finally:
+            self._pending -= 1
+            self._completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit("verify", _verify, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+
+hasher = PasswordHasher()
+
+
+async def get_password_hash(password: str) -> str:
+    return await hasher.hash(password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await hasher.verify(plain_password, hashed_password)
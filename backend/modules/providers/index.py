@@ -0,0 +1,354 @@
+"""Optional in-memory columnar index over the filterable provider fields.
+
+Enable with ``PROVIDER_INDEX=1``; it needs NumPy, which is not in
+requirements.txt. Without NumPy (or with the flag off) search keeps using
+SQLite.
+
+Each provider is one slot in a set of parallel arrays:
+
+* ``service_type`` as ``int16`` codes (the ``ServiceType`` values first, any
+  other stored value appended as it is seen);
+* ``hourly_rate`` and ``rating`` as ``float32`` (NULL is NaN, so it never
+  matches a range, as in SQL);
+* one ``uint8`` of bit flags per slot: active, verified and live (cleared when
+  the provider is deleted).
+
+For each sort order the index also keeps the slots pre-sorted, with ties broken
+by id exactly as the SQL ``ORDER BY`` does. A search is one boolean mask over
+the columns, a gather of that mask in sort order and a slice, so it never
+touches SQLite. Only the matching ids are hydrated afterwards.
+
+Snapshots are immutable: a refresh builds a new one and swaps it in, so readers
+never need a lock. Refreshes follow the provider change feed (``change_seq`` and
+``provider_tombstones``) every ``PROVIDER_INDEX_REFRESH_SECONDS``. They read only
+the rows written since the last refresh, including writes made by other worker
+processes. Filtering can therefore lag a write by up to one interval.
+
+A refresh copies only the columns it changes. Each sort order is kept as slots
+sorted by one ``int64`` key (the sort value's bits, then the id rank), so a
+changed provider is taken out and re-inserted by binary search rather than the
+whole order being re-sorted.
+"""
+import bisect
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, get_args
+
+
+import database
+from .. import metrics
+from .models import ServiceType
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+PROVIDER_INDEX = os.getenv("PROVIDER_INDEX", "0").lower() in ("1", "true", "yes")
+PROVIDER_INDEX_REFRESH_SECONDS = float(os.getenv("PROVIDER_INDEX_REFRESH_SECONDS", "0.5"))
+
+FLAG_ACTIVE = 1
+FLAG_VERIFIED = 2
+FLAG_LIVE = 4
+
+logger = logging.getLogger(__name__)
+
+index_query_latency = metrics.registry.histogram(
+    "provider_index_query_seconds", "Provider index filter and top-k time, excluding hydration.",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01))
+
+SORTS = ("rating", "price", "price_desc")
+
+_SELECT = "SELECT id, service_type, hourly_rate, rating, is_verified, is_active FROM providers"
+
+
+class _Snapshot:
+    __slots__ = ("ids", "positions", "categories", "service_type", "hourly_rate", "rating", "flags",
+                 "id_rank", "orders", "seq", "dead", "id_bytes")
+
+
+def _flags(row) -> int:
+    return FLAG_LIVE | (FLAG_ACTIVE if row["is_active"] else 0) | (FLAG_VERIFIED if row["is_verified"] else 0)
+
+
+def _code(categories: Dict[str, int], value: Optional[str]) -> int:
+    if value is None:
+        return -1
+    code = categories.get(value)
+    if code is None:
+        code = categories[value] = len(categories)
+    return code
+
+
+def _float(value) -> float:
+    return np.nan if value is None else value
+
+
+def _id_rank(ids: List[str]) -> "np.ndarray":
+    """Each slot's position in id order."""
+    n = len(ids)
+    id_rank = np.empty(n, dtype=np.int32)
+    id_rank[np.argsort(np.array(ids, dtype=str), kind="stable")] = np.arange(n, dtype=np.int32)
+    return id_rank
+
+
+def _extend_id_rank(ids: List[str], id_rank: "np.ndarray") -> "np.ndarray":
+    """Ranks for ``ids`` when only the slots past ``len(id_rank)`` are new; old ranks shift, never reorder."""
+    n = len(id_rank)
+    new = sorted(range(n, len(ids)), key=ids.__getitem__)
+    if len(new) * 16 > n:
+        return _id_rank(ids)
+    by_rank = np.empty(n, dtype=np.int32)
+    by_rank[id_rank] = np.arange(n, dtype=np.int32)
+    # Old rank each new id goes in front of
+    points = np.array([bisect.bisect_left(by_rank, ids[slot], key=ids.__getitem__) for slot in new],
+                      dtype=np.int32)
+    extended = np.empty(len(ids), dtype=np.int32)
+    extended[:n] = id_rank + np.searchsorted(points, id_rank, side="right")
+    extended[new] = points + np.arange(len(new), dtype=np.int32)
+    return extended
+
+
+def _ordered(values: "np.ndarray") -> "np.ndarray":
+    """``float32`` values (no NaN) as ``int64`` that sort the same way."""
+    bits = (values + np.float32(0)).view(np.int32).astype(np.int64)  # + 0 turns -0.0 into 0.0
+    return np.where(bits < 0, bits ^ 0x7FFFFFFF, bits)
+
+
+def _sort_key(snapshot: _Snapshot, sort: str) -> "np.ndarray":
+    """One ``int64`` per slot in ``SEARCH_SORTS`` order, including NULL placement and id ties."""
+    rank = snapshot.id_rank.astype(np.int64)
+    # SQLite sorts NULL first ascending and last descending
+    if sort == "rating":
+        return (_ordered(-np.nan_to_num(snapshot.rating, nan=-np.inf)) << 32) + rank
+    if sort == "price":
+        return (_ordered(np.nan_to_num(snapshot.hourly_rate, nan=-np.inf)) << 32) + rank
+    return (_ordered(np.nan_to_num(-snapshot.hourly_rate, nan=np.inf)) << 32) + (np.iinfo(np.int32).max - rank)
+
+
+def _reorder(order: "np.ndarray", keys: "np.ndarray", moved: "np.ndarray") -> "np.ndarray":
+    """``order`` with the ``moved`` slots taken out and re-inserted where ``keys`` now puts them."""
+    keep = np.ones(len(keys), dtype=bool)
+    keep[moved] = False
+    rest = order[keep[order]]
+    moved = moved[np.argsort(keys[moved])]
+    return np.insert(rest, np.searchsorted(keys[rest], keys[moved]), moved)
+
+
+def _write(array: "np.ndarray", size: int, slots: "np.ndarray", values: "np.ndarray", fill):
+    """``array`` grown to ``size`` with ``values`` at ``slots``, and the slots that changed.
+
+    Returns ``array`` itself when nothing changes, so untouched columns are shared
+    between snapshots instead of copied.
+    """
+    current = np.full(len(slots), fill, dtype=array.dtype)
+    existing = slots < len(array)
+    current[existing] = array[slots[existing]]
+    same = current == values
+    if array.dtype.kind == "f":
+        same |= np.isnan(current) & np.isnan(values)
+    changed = slots[~same | ~existing]
+    if size == len(array):
+        if not len(changed):
+            return array, changed
+        array = array.copy()
+    else:
+        array = np.concatenate([array, np.full(size - len(array), fill, dtype=array.dtype)])
+    array[slots] = values
+    return array, changed
+
+
+def _build(rows: list, seq: int) -> _Snapshot:
+    snapshot = _Snapshot()
+    snapshot.categories = {value: code for code, value in enumerate(get_args(ServiceType))}
+    snapshot.ids = [row["id"] for row in rows]
+    snapshot.positions = {provider_id: position for position, provider_id in enumerate(snapshot.ids)}
+    snapshot.service_type = np.fromiter(
+        (_code(snapshot.categories, row["service_type"]) for row in rows), dtype=np.int16, count=len(rows))
+    snapshot.hourly_rate = np.array([_float(row["hourly_rate"]) for row in rows], dtype=np.float32)
+    snapshot.rating = np.array([_float(row["rating"]) for row in rows], dtype=np.float32)
+    snapshot.flags = np.fromiter((_flags(row) for row in rows), dtype=np.uint8, count=len(rows))
+    snapshot.id_rank = _id_rank(snapshot.ids)
+    snapshot.orders = {sort: np.argsort(_sort_key(snapshot, sort)).astype(np.int32) for sort in SORTS}
+    snapshot.seq = seq
+    snapshot.dead = 0
+    snapshot.id_bytes = sum(sys.getsizeof(provider_id) for provider_id in snapshot.ids)
+    return snapshot
+
+
+def _apply(old: _Snapshot, upserts: list, deleted: list, seq: int) -> _Snapshot:
+    """A new snapshot with ``upserts`` written and ``deleted`` ids marked dead.
+
+    Copy on write, in time proportional to the change: columns, ids and
+    categories nothing touched are shared with ``old``, and sort orders only
+    move the slots whose sort value changed.
+    """
+    snapshot = _Snapshot()
+    added = [row["id"] for row in upserts if row["id"] not in old.positions]
+    removed = [provider_id for provider_id in deleted if provider_id in old.positions]
+    snapshot.ids, snapshot.positions = old.ids, old.positions
+    if added or removed:
+        snapshot.ids = old.ids + added
+        snapshot.positions = dict(old.positions)
+        snapshot.positions.update(zip(added, range(len(old.ids), len(snapshot.ids))))
+    size = len(snapshot.ids)
+    snapshot.categories = old.categories
+    if any(row["service_type"] is not None and row["service_type"] not in old.categories for row in upserts):
+        snapshot.categories = dict(old.categories)
+
+    slots = np.array([snapshot.positions[row["id"]] for row in upserts], dtype=np.int64)
+    dead = np.array([snapshot.positions.pop(provider_id) for provider_id in removed], dtype=np.int64)
+    snapshot.service_type, _ = _write(old.service_type, size, slots, np.array(
+        [_code(snapshot.categories, row["service_type"]) for row in upserts], dtype=np.int16), -1)
+    snapshot.hourly_rate, rate_moved = _write(old.hourly_rate, size, slots, np.array(
+        [_float(row["hourly_rate"]) for row in upserts], dtype=np.float32), np.nan)
+    snapshot.rating, rating_moved = _write(old.rating, size, slots, np.array(
+        [_float(row["rating"]) for row in upserts], dtype=np.float32), np.nan)
+    snapshot.flags, _ = _write(old.flags, size, np.concatenate([slots, dead]), np.array(
+        [_flags(row) for row in upserts] + [0] * len(dead), dtype=np.uint8), 0)
+    snapshot.id_rank = _extend_id_rank(snapshot.ids, old.id_rank) if added else old.id_rank
+
+    snapshot.orders = dict(old.orders)
+    for sort, moved in (("rating", rating_moved), ("price", rate_moved), ("price_desc", rate_moved)):
+        if len(moved):
+            snapshot.orders[sort] = _reorder(old.orders[sort], _sort_key(snapshot, sort), moved)
+    snapshot.seq = seq
+    snapshot.dead = old.dead + len(removed)
+    snapshot.id_bytes = old.id_bytes + sum(sys.getsizeof(provider_id) for provider_id in added)
+    return snapshot
+
+
+class ProviderIndex:
+    def __init__(self, enabled: bool = PROVIDER_INDEX):
+        if enabled and np is None:
+            logger.warning("PROVIDER_INDEX is set but NumPy is not installed; searching SQLite instead")
+        self.enabled = enabled and np is not None
+        self._snapshot: Optional[_Snapshot] = None
+        self._full_loads = 0
+        self._refreshes = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def refresh(self) -> int:
+        """Apply provider writes since the last refresh (or load everything); rows read."""
+        snapshot = self._snapshot
+        with database.get_db_connection() as conn:
+            state = conn.execute(
+                """
+                SELECT (SELECT seq FROM sync_state WHERE name = 'providers') AS seq,
+                       (SELECT seq FROM sync_state WHERE name = 'provider_tombstones_purged') AS purged
+                """
+            ).fetchone()
+            seq = state["seq"] or 0
+            full = (
+                snapshot is None
+                or (state["purged"] is not None and snapshot.seq < state["purged"])
+                # Reclaim deleted slots once they are a quarter of the index
+                or snapshot.dead > max(1024, len(snapshot.ids) // 4)
+            )
+            if full:
+                # The sequence is read first: anything written during the scan is
+                # re-applied by the next refresh
+                rows = conn.execute(_SELECT).fetchall()
+            elif seq == snapshot.seq:
+                return 0
+            else:
+                rows = conn.execute(
+                    f"{_SELECT} WHERE change_seq > ? AND change_seq <= ?", (snapshot.seq, seq)
+                ).fetchall()
+                deleted = [row["id"] for row in conn.execute(
+                    "SELECT id FROM provider_tombstones WHERE change_seq > ? AND change_seq <= ?",
+                    (snapshot.seq, seq),
+                )]
+        if full:
+            self._snapshot = _build(rows, seq)
+            self._full_loads += 1
+        else:
+            self._snapshot = _apply(snapshot, rows, deleted, seq)
+            self._refreshes += 1
+        return len(rows)
+
+    def search(
+        self,
+        service_type: Optional[str] = None,
+        min_rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        is_verified: Optional[bool] = None,
+        sort: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20,
+    ) -> Optional[List[str]]:
+        """Ids of the matching active providers in ``sort`` order; None until the index is loaded."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        start = time.perf_counter()
+        wanted = FLAG_LIVE | FLAG_ACTIVE
+        mask = (snapshot.flags & wanted) == wanted
+        if service_type is not None:
+            code = snapshot.categories.get(service_type)
+            if code is None:
+                return []
+            mask &= snapshot.service_type == code
+        if min_rate is not None:
+            mask &= snapshot.hourly_rate >= np.float32(min_rate)
+        if max_rate is not None:
+            mask &= snapshot.hourly_rate <= np.float32(max_rate)
+        if min_rating is not None:
+            mask &= snapshot.rating >= np.float32(min_rating)
+        if is_verified is not None:
+            mask &= ((snapshot.flags & FLAG_VERIFIED) != 0) == is_verified
+        order = snapshot.orders[sort or "rating"]
+        matches = order[mask[order]][skip:skip + limit]
+        ids = [snapshot.ids[position] for position in matches]
+        index_query_latency.observe(value=time.perf_counter() - start)
+        return ids
+
+    def stats(self) -> dict:
+        """Row counts and memory footprint, per column and in total."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"enabled": self.enabled, "ready": False}
+        columns = {
+            "service_type": snapshot.service_type.nbytes,
+            "hourly_rate": snapshot.hourly_rate.nbytes,
+            "rating": snapshot.rating.nbytes,
+            "flags": snapshot.flags.nbytes,
+            "sort_orders": sum(order.nbytes for order in snapshot.orders.values()) + snapshot.id_rank.nbytes,
+            "ids": sys.getsizeof(snapshot.ids) + sys.getsizeof(snapshot.positions) + snapshot.id_bytes,
+        }
+        return {
+            "enabled": self.enabled,
+            "ready": True,
+            "rows": len(snapshot.positions),
+            "slots": len(snapshot.ids),
+            "dead_slots": snapshot.dead,
+            "categories": len(snapshot.categories),
+            "seq": snapshot.seq,
+            "full_loads": self._full_loads,
+            "refreshes": self._refreshes,
+            "bytes": columns,
+            "total_bytes": sum(columns.values()),
+        }
+
+
+provider_index = ProviderIndex()
+
+
+def _samples():
+    stats = provider_index.stats()
+    if not stats["ready"]:
+        return
+    yield "provider_index_rows", "gauge", "Live providers in the in-memory index.", [({}, stats["rows"])]
+    yield "provider_index_bytes", "gauge", "Memory held by the provider index by column.", [
+        ({"column": column}, size) for column, size in stats["bytes"].items()
+    ]
+    yield "provider_index_seq", "gauge", "Provider change sequence the index has applied.", [({}, stats["seq"])]
+
+
+metrics.registry.add_collector(_samples)
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr, confloat
+from pydantic import BaseModel, EmailStr, Field, confloat
 from typing import Optional, Literal, List
 from datetime import datetime
 
+ServiceType = Literal["Cleaning", "Plumbing", "Electrical", "Painting", "Carpentry", "Landscaping"]
+
 class ProviderBase(BaseModel):
     email: EmailStr
     full_name: str
@@ -19,7 +21,7 @@ class ProviderUpdate(BaseModel):
     password: Optional[str] = None
     phone: Optional[str] = None
     business_name: Optional[str] = None
-    service_type: Optional[Literal["Cleaning", "Plumbing", "Electrical", "Painting", "Carpentry", "Landscaping"]] = None
+    service_type: Optional[ServiceType] = None
     hourly_rate: Optional[confloat(gt=0)] = None
     location: Optional[str] = None
     working_hours: Optional[str] = None
@@ -29,7 +31,7 @@ class ProviderUpdate(BaseModel):
 
 class BusinessDetails(BaseModel):
     business_name: str
-    service_type: Literal["Cleaning", "Plumbing", "Electrical", "Painting", "Carpentry", "Landscaping"]
+    service_type: ServiceType
     hourly_rate: confloat(gt=0)
     location: str
     working_hours: str
@@ -37,9 +39,9 @@ class BusinessDetails(BaseModel):
     sa_back_id: Optional[str] = None   # URL or path to back ID image
     profile_photo: Optional[str] = None  # URL or path to profile photo
 
-class ProviderInDB(ProviderBase):
+class ProviderPublic(ProviderBase):
+    """Provider fields that may be sent to clients"""
     id: str
-    password: str
     phone: Optional[str] = None
     business_name: Optional[str] = None
     service_type: Optional[str] = None
@@ -49,13 +51,38 @@ class ProviderInDB(ProviderBase):
     sa_front_id: Optional[str] = None
     sa_back_id: Optional[str] = None
     profile_photo: Optional[str] = None
+    profile_photo_thumb: Optional[str] = None
+    profile_photo_medium: Optional[str] = None
     rating: float = 0.0
     reviews_count: int = 0
     is_verified: bool = False
     image: str = "/images/placeholder.jpg"
     created_at: datetime
     updated_at: datetime
-    is_active: bool = True 
+    is_active: bool = True
+
+class ProviderInDB(ProviderPublic):
+    password: str
+
+class ProviderBatchRequest(BaseModel):
+    """Providers to fetch in one call, optionally only some of their public fields"""
+    ids: List[str] = Field(..., min_length=1)
+    fields: Optional[List[str]] = None  # "id" is always included
+
+class ProviderImport(ProviderBase):
+    """One NDJSON line of a bulk provider import"""
+    id: Optional[str] = None
+    password: str  # plaintext, or an existing bcrypt hash which is kept as-is
+    phone: Optional[str] = None
+    business_name: Optional[str] = None
+    service_type: Optional[ServiceType] = None
+    hourly_rate: Optional[confloat(gt=0)] = None
+    location: Optional[str] = None
+    working_hours: Optional[str] = None
+    is_verified: bool = False
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 class Token(BaseModel):
     access_token: str
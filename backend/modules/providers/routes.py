@@ -1,45 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Query, Request, Response, BackgroundTasks
+from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
-from typing import List
-from .models import ProviderCreate, ProviderUpdate, ProviderInDB, BusinessDetails
+from typing import List, Optional, Literal
+from .models import ProviderCreate, ProviderUpdate, ProviderPublic, ProviderBatchRequest, BusinessDetails, ServiceType
 from .service import (
     create_provider,
     update_business_details,
     get_provider,
+    get_providers_batch,
     get_provider_by_email,
     update_provider,
     delete_provider,
+    generate_profile_photo_variants,
     list_providers,
+    list_providers_page,
+    list_providers_page_validators,
+    get_provider_updated_at,
+    search_providers,
+    export_providers,
+    import_providers,
+    provider_changes,
+    ChangeCursorExpired,
     verify_password,
     get_password_hash,
-    create_access_token,
+)
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from ..auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    verify_token
+    create_access_token,
+    get_optional_principal,
+    load_principal,
+    Principal,
+    require_admin,
+)
+from ..admission import admit_login, admit_registration
+from ..tokens import RefreshRequest, issue_refresh_token, rotate_refresh_token
+from database import UnitOfWork, get_unit_of_work
+from ..uploads import save_uploads
+from ..conditional import (
+    has_conditions,
+    is_not_modified,
+    not_modified,
+    page_etag,
+    page_last_modified,
+    row_etag,
+    validator_headers,
 )
-import os
-from fastapi.responses import JSONResponse
 
 router = APIRouter(tags=["providers"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-UPLOAD_DIR = "uploaded_images"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/register", response_model=dict)
-def register_provider(provider: ProviderCreate):
+@router.post("/register", response_model=dict, dependencies=[Depends(admit_registration)])
+async def register_provider(provider: ProviderCreate):
     """Step 1: Register a new provider with basic info"""
     # Check if provider already exists
-    if get_provider_by_email(provider.email):
+    if await get_provider_by_email(provider.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Create new provider
-    provider.password = get_password_hash(provider.password)
+    provider.password = await get_password_hash(provider.password)
     provider_obj = provider
-    provider = create_provider(provider_obj)
+    provider = await create_provider(provider_obj)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -47,28 +70,27 @@ def register_provider(provider: ProviderCreate):
         data={"sub": provider.email, "user_type": "provider", "provider_id": provider.id},
         expires_delta=access_token_expires
     )
+    refresh_token = await issue_refresh_token("provider", provider.id)
     
-    return {"access_token": access_token, "token_type": "bearer", "provider_id": provider.id}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "provider_id": provider.id,
+    }
 
-@router.post("/login", response_model=dict)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+@router.post("/login", response_model=dict, dependencies=[Depends(admit_login)])
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login for providers"""
-    provider = get_provider_by_email(form_data.username)
-    print("Provider from DB:", provider)
-    print("Password from form:", form_data.password)
+    provider = await get_provider_by_email(form_data.username)
     if not provider:
-        print("Provider not found")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Debug password check
-    password_check = verify_password(form_data.password, provider.password)
-    print("Password check result:", password_check)
-    if not password_check:
-        print("Password does not match")
+    if not await verify_password(form_data.password, provider.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Incorrect email or password",
@@ -87,15 +109,45 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
         data={"sub": provider.email, "user_type": "provider", "provider_id": provider.id},
         expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer", "provider_id": provider.id}
+    refresh_token = await issue_refresh_token("provider", provider.id)
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "provider_id": provider.id,
+    }
+
+@router.post("/token", response_model=dict, dependencies=[Depends(admit_login)])
+async def login_token(form_data: OAuth2PasswordRequestForm = Depends()):
+    return await login(form_data)
 
-@router.post("/token", response_model=dict)
-def login_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    return login(form_data)
+@router.post("/refresh", response_model=dict)
+async def refresh(body: RefreshRequest):
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    rotated = await rotate_refresh_token(body.refresh_token, "provider")
+    principal = await load_principal("provider", rotated[0]) if rotated else None
+    if principal is None or not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-@router.post("/{provider_id}/business-details", response_model=ProviderInDB)
+    access_token = create_access_token(
+        data={"sub": principal.email, "user_type": "provider", "provider_id": principal.id},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": rotated[1],
+        "provider_id": principal.id,
+    }
+
+@router.post("/{provider_id}/business-details", response_model=ProviderPublic)
 async def add_business_details(
     provider_id: str,
+    background_tasks: BackgroundTasks,
     business_name: str = Form(...),
     service_type: str = Form(...),
     hourly_rate: float = Form(...),
@@ -103,18 +155,12 @@ async def add_business_details(
     working_hours: str = Form(...),
     sa_front_id: UploadFile = File(...),
     sa_back_id: UploadFile = File(...),
-    profile_photo: UploadFile = File(...)
+    profile_photo: UploadFile = File(...),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ):
-    # Save files
-    async def save_file(file: UploadFile):
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as f:
-            f.write(await file.read())
-        return f"/uploaded_images/{file.filename}"
-
-    sa_front_id_path = await save_file(sa_front_id)
-    sa_back_id_path = await save_file(sa_back_id)
-    profile_photo_path = await save_file(profile_photo)
+    sa_front_id_path, sa_back_id_path, profile_photo_path = await save_uploads(
+        sa_front_id, sa_back_id, profile_photo
+    )
 
     business_details = BusinessDetails(
         business_name=business_name,
@@ -126,30 +172,127 @@ async def add_business_details(
         sa_back_id=sa_back_id_path,
         profile_photo=profile_photo_path
     )
-    return update_business_details(provider_id, business_details)
+    provider = await update_business_details(provider_id, business_details, uow)
+    if not provider:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Provider not found"
+        )
+    await uow.commit()
+    background_tasks.add_task(generate_profile_photo_variants, provider_id, profile_photo_path)
+    return provider
 
-@router.get("/me", response_model=ProviderInDB)
-async def get_current_provider():
-    """Get current provider's details (now public, returns first provider)"""
-    providers = list_providers(limit=1)
+@router.get("/search", response_model=List[ProviderPublic])
+async def search(
+    q: Optional[str] = Query(None, max_length=200),
+    service_type: Optional[ServiceType] = None,
+    location: Optional[str] = Query(None, max_length=200),
+    min_rate: Optional[float] = Query(None, ge=0),
+    max_rate: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    is_verified: Optional[bool] = None,
+    sort: Optional[Literal["rating", "price", "price_desc"]] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Search active providers by text, filters and sort order"""
+    providers = await search_providers(
+        q=q,
+        service_type=service_type,
+        location=location,
+        min_rate=min_rate,
+        max_rate=max_rate,
+        min_rating=min_rating,
+        is_verified=is_verified,
+        sort=sort,
+        skip=skip,
+        limit=limit,
+    )
+    return ORJSONResponse(providers)
+
+@router.post("/batch")
+async def get_providers_by_ids(batch: ProviderBatchRequest):
+    """Fetch many providers by id in one call.
+
+    Returns ``{"providers": {id: provider}, "missing": [id, ...]}``; pass
+    ``fields`` to receive only those public fields of each provider.
+    """
+    try:
+        providers, missing = await get_providers_batch(batch.ids, batch.fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return ORJSONResponse({"providers": providers, "missing": missing})
+
+@router.get("/changes")
+async def get_provider_changes(since: int = Query(0, ge=0)):
+    """Stream providers created, updated or deleted since a cursor, as NDJSON.
+
+    Start with ``since=0`` for a full copy; afterwards pass the previous
+    response's ``X-Next-Cursor`` header. ``410`` means the cursor is too old
+    and the client must resync from 0.
+    """
+    try:
+        seq, changes = await provider_changes(since)
+    except ChangeCursorExpired:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor expired, resync from 0")
+    return StreamingResponse(changes, media_type="application/x-ndjson", headers={"X-Next-Cursor": str(seq)})
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+async def export_all_providers(include_password: bool = False):
+    """Stream every provider as NDJSON (admin only)"""
+    return StreamingResponse(export_providers(include_password), media_type="application/x-ndjson")
+
+@router.post("/import", dependencies=[Depends(require_admin)])
+async def import_all_providers(request: Request, upsert: bool = False):
+    """Bulk-insert providers from an NDJSON request body (admin only)"""
+    return await import_providers(request.stream(), upsert=upsert)
+
+@router.get("/me", response_model=ProviderPublic)
+async def get_current_provider(principal: Optional[Principal] = Depends(get_optional_principal)):
+    """Get current provider's details.
+
+    With a provider bearer token this is that provider; without one it stays
+    public and returns the newest provider, as before.
+    """
+    if principal is not None:
+        if principal.type != "provider":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        provider = await get_provider(principal.id)
+        if not provider:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found")
+        return provider
+    providers = await list_providers(limit=1)
     if not providers:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No providers found")
     return providers[0]
 
-@router.get("/{provider_id}", response_model=ProviderInDB)
-async def get_provider_details(provider_id: str):
-    """Get provider details by ID"""
-    provider = get_provider(provider_id)
+@router.get("/{provider_id}", response_model=ProviderPublic)
+async def get_provider_details(provider_id: str, request: Request):
+    """Get provider details by ID; supports If-None-Match and If-Modified-Since"""
+    if has_conditions(request.headers):
+        updated_at = await get_provider_updated_at(provider_id)
+        if updated_at is not None:
+            etag = row_etag(provider_id, updated_at)
+            if is_not_modified(request.headers, etag, updated_at):
+                return not_modified(validator_headers(etag, updated_at))
+    provider = await get_provider(provider_id)
     if not provider:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Provider not found"
         )
-    return provider
+    # The cached model is already validated; serialize it once without the hash
+    headers = validator_headers(row_etag(provider.id, provider.updated_at), provider.updated_at)
+    return Response(provider.model_dump_json(exclude={"password"}), media_type="application/json", headers=headers)
 
-@router.put("/{provider_id}", response_model=ProviderInDB)
+@router.put("/{provider_id}", response_model=ProviderPublic)
 async def update_provider_details(
     provider_id: str,
+    background_tasks: BackgroundTasks,
     full_name: str = Form(None),
     email: str = Form(None),
     password: str = Form(None),
@@ -161,61 +304,73 @@ async def update_provider_details(
     working_hours: str = Form(None),
     sa_front_id: UploadFile = File(None),
     sa_back_id: UploadFile = File(None),
-    profile_photo: UploadFile = File(None)
+    profile_photo: UploadFile = File(None),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ):
-    # Save new images if provided
-    async def save_file(file: UploadFile):
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as f:
-            f.write(await file.read())
-        return f"/uploaded_images/{file.filename}"
-
     update_data = {}
     if full_name is not None: update_data["full_name"] = full_name
     if email is not None: update_data["email"] = email
-    if password is not None: update_data["password"] = get_password_hash(password)
+    if password is not None: update_data["password"] = await get_password_hash(password)
     if phone is not None: update_data["phone"] = phone
     if business_name is not None: update_data["business_name"] = business_name
     if service_type is not None: update_data["service_type"] = service_type
     if hourly_rate is not None: update_data["hourly_rate"] = hourly_rate
     if location is not None: update_data["location"] = location
     if working_hours is not None: update_data["working_hours"] = working_hours
-    if sa_front_id is not None:
-        update_data["sa_front_id"] = await save_file(sa_front_id)
-    if sa_back_id is not None:
-        update_data["sa_back_id"] = await save_file(sa_back_id)
-    if profile_photo is not None:
-        update_data["profile_photo"] = await save_file(profile_photo)
+
+    # Save new images if provided
+    saved = await save_uploads(sa_front_id, sa_back_id, profile_photo)
+    for field, path in zip(("sa_front_id", "sa_back_id", "profile_photo"), saved):
+        if path is not None:
+            update_data[field] = path
 
     provider_update = ProviderUpdate(**update_data)
-    updated_provider = update_provider(provider_id, provider_update)
+    updated_provider = await update_provider(provider_id, provider_update, uow)
     if not updated_provider:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Provider not found"
         )
+    await uow.commit()
+    if "profile_photo" in update_data:
+        background_tasks.add_task(generate_profile_photo_variants, provider_id, update_data["profile_photo"])
     return updated_provider
 
 @router.delete("/{provider_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_provider_account(
-    provider_id: str
+    provider_id: str,
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ):
     """Delete provider account"""
-    # Verify the provider exists
-    provider = get_provider(provider_id)
-    if not provider:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Provider not found"
-        )
-    success = delete_provider(provider_id)
+    success = await delete_provider(provider_id, uow)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Provider not found"
         )
+    await uow.commit()
+
+@router.get("/", response_model=List[ProviderPublic])
+async def get_all_providers(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """List all providers, newest first.
 
-@router.get("/", response_model=List[ProviderInDB])
-async def get_all_providers(skip: int = 0, limit: int = 100):
-    """List all providers"""
-    return list_providers(skip=skip, limit=limit) 
\ No newline at end of file
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch the
+    next page; the header is absent on the last page. Pages carry an ETag, so
+    polling with If-None-Match gets an empty 304 while the page is unchanged.
+    """
+    try:
+        if has_conditions(request.headers):
+            rows, next_cursor = await list_providers_page_validators(limit=limit, cursor=cursor, skip=skip)
+            etag = page_etag(rows)
+            if is_not_modified(request.headers, etag):
+                headers = validator_headers(etag, page_last_modified(rows))
+                if next_cursor:
+                    headers["X-Next-Cursor"] = next_cursor
+                return not_modified(headers)
+        providers, next_cursor = await list_providers_page(limit=limit, cursor=cursor, skip=skip)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    headers = validator_headers(page_etag(providers), page_last_modified(providers))
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return ORJSONResponse(providers, headers=headers) 
\ No newline at end of file
@@ -1,47 +1,70 @@
 from datetime import datetime, timedelta
+import logging
+import re
 import uuid
-from typing import Optional, List
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from .models import ProviderCreate, ProviderUpdate, ProviderInDB, BusinessDetails
-from database import execute_query, execute_query_one
-from ..utils import get_password_hash
+from typing import AsyncIterator, Optional, List, Tuple
+from .models import ProviderCreate, ProviderUpdate, ProviderInDB, ProviderPublic, BusinessDetails, ProviderImport
+from database import execute_query_async, execute_query_one_async, stream_keyset_async, transaction, UnitOfWork
+from ..utils import next_cursor, page_query
+from ..passwords import verify_password, get_password_hash
+from ..cache import TTLCache
+from ..auth import invalidate_principal
+from ..bulk import export_ndjson, import_ndjson
+from ..writer import writer
+from .index import provider_index
+from ..tokens import revoke_principal_tokens
+from ..serialization import row_converter, select_columns
+from ..images import render_variants_async
+from ..blobstore import upload_path, upload_url, replace_refs
 from dotenv import load_dotenv
+import orjson
 import os
 
 load_dotenv()
 
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Change feed: rows per streamed batch, and how long delete tombstones are kept.
+# A client whose cursor predates the purged tombstones has to resync from 0.
+CHANGES_BATCH_SIZE = int(os.getenv("CHANGES_BATCH_SIZE", "500"))
+PROVIDER_TOMBSTONE_RETENTION_DAYS = float(os.getenv("PROVIDER_TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_PURGE_INTERVAL_SECONDS = int(os.getenv("TOMBSTONE_PURGE_INTERVAL_SECONDS", "3600"))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Batch fetch: ids accepted per request, and ids bound per IN (...) query (kept
+# under SQLite's 999-variable limit for builds older than 3.32)
+PROVIDER_BATCH_MAX_IDS = int(os.getenv("PROVIDER_BATCH_MAX_IDS", "500"))
+BATCH_QUERY_CHUNK = 500
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# Read-through caches: id -> ProviderInDB, and email -> id (validated against
+# the cached provider on read, so a changed email can never return a stale hit)
+provider_cache = TTLCache("providers")
+provider_email_cache = TTLCache("provider_emails")
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+def invalidate_provider(provider_id: str):
+    provider_cache.invalidate(provider_id)
+    invalidate_principal("provider", provider_id)
 
-def verify_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
+# List endpoints select only public columns and skip per-row model validation
+PUBLIC_COLUMNS = select_columns(ProviderPublic)
+to_public = row_converter(ProviderPublic)
+
+# Columns holding blob store URLs; each non-null value is one blob reference
+IMAGE_FIELDS = ("sa_front_id", "sa_back_id", "profile_photo")
+
+def _write_with_image_refs(conn, provider_id: str, query: str, params: tuple, deleting: bool = False) -> Optional[dict]:
+    """Run an UPDATE/DELETE ... RETURNING on one provider inside ``conn``'s transaction
+    and move blob references from its old images to the new ones."""
+    old = conn.execute(
+        "SELECT sa_front_id, sa_back_id, profile_photo FROM providers WHERE id = ?", (provider_id,)
+    ).fetchone()
+    row = conn.execute(query, params).fetchone()
+    if old is None or row is None:
         return None
+    new_images = [] if deleting else [row[field] for field in IMAGE_FIELDS]
+    replace_refs(conn, [old[field] for field in IMAGE_FIELDS], new_images)
+    return dict(row)
 
-def create_provider(provider: ProviderCreate) -> ProviderInDB:
+async def create_provider(provider: ProviderCreate) -> ProviderInDB:
     provider_id = str(uuid.uuid4())
     now = datetime.utcnow()
     query = """
@@ -50,13 +73,15 @@ def create_provider(provider: ProviderCreate) -> ProviderInDB:
     ) VALUES (?, ?, ?, ?, ?, ?)
     RETURNING *
     """
-    result = execute_query_one(
+    result = await writer.execute_one(
         query,
         (provider_id, provider.email, provider.full_name, provider.password, now, now)
     )
     return ProviderInDB(**result)
 
-def update_business_details(provider_id: str, business_details: BusinessDetails) -> ProviderInDB:
+async def update_business_details(
+    provider_id: str, business_details: BusinessDetails, uow: UnitOfWork
+) -> Optional[ProviderInDB]:
     now = datetime.utcnow()
     query = """
     UPDATE providers
@@ -68,11 +93,15 @@ def update_business_details(provider_id: str, business_details: BusinessDetails)
         sa_front_id = ?,
         sa_back_id = ?,
         profile_photo = ?,
+        profile_photo_thumb = NULL,
+        profile_photo_medium = NULL,
         updated_at = ?
     WHERE id = ?
     RETURNING *
     """
-    result = execute_query_one(
+    result = await uow.run(
+        _write_with_image_refs,
+        provider_id,
         query,
         (
             business_details.business_name,
@@ -87,20 +116,73 @@ def update_business_details(provider_id: str, business_details: BusinessDetails)
             provider_id
         )
     )
-    print("--------->", result)
+    if not result:
+        return None
+    uow.after_commit(invalidate_provider, provider_id)
     return ProviderInDB(**result)
 
-def get_provider(provider_id: str) -> Optional[ProviderInDB]:
+async def get_provider(provider_id: str) -> Optional[ProviderInDB]:
+    provider = provider_cache.get(provider_id)
+    if provider is not None:
+        return provider
+    # Taken before the read, so a write committed meanwhile keeps its row out of the cache
+    generation = provider_cache.generation()
     query = "SELECT * FROM providers WHERE id = ?"
-    result = execute_query_one(query, (provider_id,))
-    return ProviderInDB(**result) if result else None
+    result = await execute_query_one_async(query, (provider_id,))
+    if not result:
+        return None
+    provider = ProviderInDB(**result)
+    provider_cache.set(provider_id, provider, generation=generation)
+    return provider
+
+async def get_providers_batch(
+    ids: List[str], fields: Optional[List[str]] = None
+) -> Tuple[dict, List[str]]:
+    """Public rows for ``ids`` keyed by id, plus the ids that don't exist, both in request order.
+
+    ``fields`` limits the columns read and returned (``id`` is always
+    included). Raises ValueError for unknown fields or too many ids.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > PROVIDER_BATCH_MAX_IDS:
+        raise ValueError(f"At most {PROVIDER_BATCH_MAX_IDS} ids per request")
+    if fields is None:
+        columns = PUBLIC_COLUMNS
+    else:
+        unknown = sorted(set(fields) - set(ProviderPublic.model_fields))
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        columns = ", ".join(dict.fromkeys(["id", *fields]))
+    found = {}
+    for start in range(0, len(ids), BATCH_QUERY_CHUNK):
+        chunk = ids[start:start + BATCH_QUERY_CHUNK]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = await execute_query_async(f"SELECT {columns} FROM providers WHERE id IN ({placeholders})", chunk)
+        for row in rows:
+            found[row["id"]] = to_public(row)
+    providers = {provider_id: found[provider_id] for provider_id in ids if provider_id in found}
+    return providers, [provider_id for provider_id in ids if provider_id not in found]
 
-def get_provider_by_email(email: str) -> Optional[ProviderInDB]:
+async def get_provider_by_email(email: str) -> Optional[ProviderInDB]:
+    provider_id = provider_email_cache.get(email)
+    if provider_id is not None:
+        provider = await get_provider(provider_id)
+        if provider and provider.email == email:
+            return provider
+        provider_email_cache.invalidate(email)
+    generation = provider_cache.generation()
     query = "SELECT * FROM providers WHERE email = ?"
-    result = execute_query_one(query, (email,))
-    return ProviderInDB(**result) if result else None
+    result = await execute_query_one_async(query, (email,))
+    if not result:
+        return None
+    provider = ProviderInDB(**result)
+    provider_cache.set(provider.id, provider, generation=generation)
+    provider_email_cache.set(email, provider.id)
+    return provider
 
-def update_provider(provider_id: str, provider_update: ProviderUpdate) -> Optional[ProviderInDB]:
+async def update_provider(
+    provider_id: str, provider_update: ProviderUpdate, uow: UnitOfWork
+) -> Optional[ProviderInDB]:
     update_fields = []
     values = []
     for field, value in provider_update.dict(exclude_unset=True).items():
@@ -108,7 +190,10 @@ def update_provider(provider_id: str, provider_update: ProviderUpdate) -> Option
             update_fields.append(f"{field} = ?")
             values.append(value)
     if not update_fields:
-        return get_provider(provider_id)
+        return await get_provider(provider_id)
+    if "profile_photo = ?" in update_fields:
+        # Variants of the old photo are stale; new ones are generated in the background
+        update_fields += ["profile_photo_thumb = NULL", "profile_photo_medium = NULL"]
     values.append(datetime.utcnow())
     values.append(provider_id)
     query = f"""
@@ -117,20 +202,261 @@ def update_provider(provider_id: str, provider_update: ProviderUpdate) -> Option
     WHERE id = ?
     RETURNING *
     """
-    result = execute_query_one(query, tuple(values))
-    return ProviderInDB(**result) if result else None
+    result = await uow.run(_write_with_image_refs, provider_id, query, tuple(values))
+    if not result:
+        return None
+    uow.after_commit(invalidate_provider, provider_id)
+    return ProviderInDB(**result)
+
+async def generate_profile_photo_variants(provider_id: str, profile_photo: str):
+    """Render thumbnail/medium variants of a profile photo and record their URLs.
 
-def delete_provider(provider_id: str) -> bool:
+    Meant to run as a background task after the response has been sent. The
+    URLs are only stored if ``profile_photo`` is still the provider's photo.
+    """
+    source = upload_path(profile_photo)
+    if source is None:
+        return
+    try:
+        variants = await render_variants_async(source)
+    except Exception:
+        logger.exception("Could not render variants of %s", source)
+        return
+    query = """
+    UPDATE providers
+    SET profile_photo_thumb = ?, profile_photo_medium = ?, updated_at = ?
+    WHERE id = ? AND profile_photo = ?
+    """
+    await writer.execute(
+        query,
+        (
+            upload_url(variants["thumb"]),
+            upload_url(variants["medium"]),
+            datetime.utcnow(),
+            provider_id,
+            profile_photo,
+        ),
+    )
+    invalidate_provider(provider_id)
+
+async def delete_provider(provider_id: str, uow: UnitOfWork) -> bool:
     query = "DELETE FROM providers WHERE id = ? RETURNING id"
-    result = execute_query_one(query, (provider_id,))
+    result = await uow.run(_write_with_image_refs, provider_id, query, (provider_id,), True)
+    if result:
+        await uow.run(revoke_principal_tokens, "provider", provider_id)
+        await uow.execute("DELETE FROM reviews WHERE provider_id = ?", (provider_id,))
+        uow.after_commit(invalidate_provider, provider_id)
     return bool(result)
 
-def list_providers(skip: int = 0, limit: int = 100) -> List[ProviderInDB]:
-    query = "SELECT * FROM providers ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    results = execute_query(query, (limit, skip))
-    return [ProviderInDB(**row) for row in results]
+async def list_providers(skip: int = 0, limit: int = 100) -> List[ProviderPublic]:
+    providers, _ = await list_providers_page(limit=limit, skip=skip)
+    return [ProviderPublic(**row) for row in providers]
 
-def get_providers_by_service_type(service_type: str) -> List[ProviderInDB]:
+async def list_providers_page(
+    limit: int = 100, cursor: Optional[str] = None, skip: int = 0
+) -> Tuple[List[dict], Optional[str]]:
+    """Newest-first page of providers (as public JSON-ready dicts) plus the cursor for the next page.
+
+    With a cursor the page is a keyset seek on (created_at, id), so deep pages
+    cost the same as the first one; ``skip`` is only honoured without a cursor.
+    Raises ValueError for a malformed cursor.
+    """
+    query, params = page_query("providers", PUBLIC_COLUMNS, limit, cursor, skip)
+    results = await execute_query_async(query, params)
+    # Before to_public, which rewrites created_at in place
+    after = next_cursor(results, limit)
+    return [to_public(row) for row in results], after
+
+async def list_providers_page_validators(
+    limit: int = 100, cursor: Optional[str] = None, skip: int = 0
+) -> Tuple[List[dict], Optional[str]]:
+    """``id``, ``created_at`` and ``updated_at`` of the same page, read from the index alone."""
+    query, params = page_query("providers", "id, created_at, updated_at", limit, cursor, skip)
+    results = await execute_query_async(query, params)
+    return results, next_cursor(results, limit)
+
+async def get_provider_updated_at(provider_id: str) -> Optional[str]:
+    """A provider's ``updated_at`` (for conditional requests).
+
+    The planner would pick the unique index on ``id`` and then read the table
+    row; the covering index answers from the index alone.
+    """
+    row = await execute_query_one_async(
+        "SELECT updated_at FROM providers INDEXED BY idx_providers_id_updated_at WHERE id = ?", (provider_id,)
+    )
+    return row["updated_at"] if row else None
+
+class ChangeCursorExpired(Exception):
+    """The cursor is older than the oldest retained tombstone (or newer than any change)."""
+
+async def provider_changes(since: int = 0) -> Tuple[int, AsyncIterator[bytes]]:
+    """The feed's current sequence and an NDJSON stream of changes in (since, sequence].
+
+    Upserts (rows created or updated) come first, then deletes, each in
+    sequence order. A row appears at most once, with its latest state. Changes
+    committed after the sequence is read are left for the next call, so the
+    returned sequence is the client's next cursor. Batches are read one by one,
+    so a row changed while the response streams is delivered by the next call.
+    """
+    state = await execute_query_one_async(
+        """
+        SELECT (SELECT seq FROM sync_state WHERE name = 'providers') AS seq,
+               (SELECT seq FROM sync_state WHERE name = 'provider_tombstones_purged') AS purged
+        """
+    )
+    seq = state["seq"] or 0
+    if since > seq or (since and state["purged"] and since < state["purged"]):
+        raise ChangeCursorExpired()
+    return seq, _stream_changes(since, seq)
+
+async def _stream_changes(since: int, until: int) -> AsyncIterator[bytes]:
+    changed = stream_keyset_async(
+        "providers", f"change_seq, {PUBLIC_COLUMNS}", ("change_seq",),
+        "change_seq <= ?", (until,), batch_size=CHANGES_BATCH_SIZE, after=(since,),
+    )
+    async for rows in changed:
+        yield b"".join(
+            orjson.dumps({"op": "upsert", "seq": row.pop("change_seq"), "provider": to_public(row)}) + b"\n"
+            for row in rows
+        )
+    deleted = stream_keyset_async(
+        "provider_tombstones", "change_seq, id, deleted_at", ("change_seq",),
+        "change_seq <= ?", (until,), batch_size=CHANGES_BATCH_SIZE, after=(since,),
+    )
+    async for rows in deleted:
+        yield b"".join(
+            orjson.dumps({"op": "delete", "seq": row["change_seq"], "id": row["id"],
+                          "deleted_at": row["deleted_at"].replace(" ", "T", 1)}) + b"\n"
+            for row in rows
+        )
+
+def purge_tombstones(retention_days: float = PROVIDER_TOMBSTONE_RETENTION_DAYS) -> int:
+    """Drop tombstones older than ``retention_days`` and raise the oldest usable cursor."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    with transaction() as conn:
+        newest = conn.execute(
+            "SELECT max(change_seq) FROM provider_tombstones WHERE deleted_at < ?", (cutoff,)
+        ).fetchone()[0]
+        if newest is None:
+            return 0
+        conn.execute(
+            """
+            INSERT INTO sync_state (name, seq) VALUES ('provider_tombstones_purged', ?)
+            ON CONFLICT (name) DO UPDATE SET seq = max(seq, excluded.seq)
+            """,
+            (newest,),
+        )
+        return conn.execute("DELETE FROM provider_tombstones WHERE change_seq <= ?", (newest,)).rowcount
+
+async def get_providers_by_service_type(service_type: str) -> List[ProviderInDB]:
     query = "SELECT * FROM providers WHERE service_type = ? AND is_active = true"
-    results = execute_query(query, (service_type,))
-    return [ProviderInDB(**row) for row in results] 
\ No newline at end of file
+    results = await execute_query_async(query, (service_type,))
+    return [ProviderInDB(**row) for row in results]
+
+# Each ordering ends in id and matches an idx_providers_*_rating/_rate index,
+# so sorted pages are read straight off the index without a temp b-tree.
+SEARCH_SORTS = {
+    "rating": "p.rating DESC, p.id",
+    "price": "p.hourly_rate, p.id",
+    "price_desc": "p.hourly_rate DESC, p.id DESC",
+}
+
+def _fts_terms(text: str) -> str:
+    """Quote each word as an FTS5 prefix term so user input can't inject query syntax"""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+async def search_providers(
+    q: Optional[str] = None,
+    service_type: Optional[str] = None,
+    location: Optional[str] = None,
+    min_rate: Optional[float] = None,
+    max_rate: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    is_verified: Optional[bool] = None,
+    sort: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 20,
+) -> List[dict]:
+    """Search active providers, returning public JSON-ready dicts.
+
+    ``q`` matches business_name, full_name and location and ``location`` matches
+    the location column, both through the providers_fts index. Without an
+    explicit sort, text searches are ordered by relevance and everything else
+    by rating.
+
+    Searches without text go to the in-memory ``provider_index`` once it is
+    loaded, and only the page of matching ids is read from SQLite.
+    """
+    if not (q and _fts_terms(q)) and not (location and _fts_terms(location)):
+        ids = provider_index.search(
+            service_type=service_type, min_rate=min_rate, max_rate=max_rate, min_rating=min_rating,
+            is_verified=is_verified, sort=sort if sort in SEARCH_SORTS else None, skip=skip, limit=limit,
+        )
+        if ids is not None:
+            providers, _ = await get_providers_batch(ids)
+            return list(providers.values())
+    conditions = ["p.is_active = 1"]
+    params = []
+    match = []
+    if q and _fts_terms(q):
+        match.append(f"({_fts_terms(q)})")
+    if location and _fts_terms(location):
+        match.append(f"location : ({_fts_terms(location)})")
+    if service_type is not None:
+        conditions.append("p.service_type = ?")
+        params.append(service_type)
+    if min_rate is not None:
+        conditions.append("p.hourly_rate >= ?")
+        params.append(min_rate)
+    if max_rate is not None:
+        conditions.append("p.hourly_rate <= ?")
+        params.append(max_rate)
+    if min_rating is not None:
+        conditions.append("p.rating >= ?")
+        params.append(min_rating)
+    if is_verified is not None:
+        conditions.append("p.is_verified = ?")
+        params.append(int(is_verified))
+
+    if match:
+        from_clause = "providers p JOIN providers_fts ON providers_fts.rowid = p.rowid"
+        conditions.insert(0, "providers_fts MATCH ?")
+        params.insert(0, " AND ".join(match))
+        order_by = SEARCH_SORTS.get(sort, "providers_fts.rank, p.id")
+    else:
+        from_clause = "providers p"
+        order_by = SEARCH_SORTS.get(sort, SEARCH_SORTS["rating"])
+
+    query = f"""
+    SELECT {select_columns(ProviderPublic, "p.")} FROM {from_clause}
+    WHERE {' AND '.join(conditions)}
+    ORDER BY {order_by}
+    LIMIT ? OFFSET ?
+    """
+    results = await execute_query_async(query, (*params, limit, skip))
+    return [to_public(row) for row in results]
+
+EXPORT_COLUMNS = (
+    "id", "email", "full_name", "phone", "business_name", "service_type", "hourly_rate",
+    "location", "working_hours", "sa_front_id", "sa_back_id", "profile_photo",
+    "profile_photo_thumb", "profile_photo_medium", "rating", "reviews_count",
+    "is_verified", "image", "created_at", "updated_at", "is_active",
+)
+IMPORT_COLUMNS = (
+    "id", "email", "full_name", "password", "phone", "business_name", "service_type",
+    "hourly_rate", "location", "working_hours", "is_verified", "is_active",
+    "created_at", "updated_at",
+)
+
+def export_providers(include_password: bool = False) -> AsyncIterator[str]:
+    """All providers as NDJSON, oldest first, read in keyset batches"""
+    columns = EXPORT_COLUMNS + (("password",) if include_password else ())
+    return export_ndjson("providers", columns, bool_columns=("is_verified", "is_active"))
+
+async def import_providers(chunks: AsyncIterator[bytes], upsert: bool = False) -> dict:
+    report = await import_ndjson(
+        chunks, ProviderImport, "providers", IMPORT_COLUMNS, upsert=upsert, on_written=invalidate_provider
+    )
+    provider_cache.clear()
+    provider_email_cache.clear()
+    return report
@@ -0,0 +1,210 @@
+"""Opt-in SQL diagnostics: per-statement stats, a slow-query log and query plans.
+
+Enable with ``QUERY_DIAGNOSTICS=1``. Statements are then timed and aggregated
+under their normalized SQL text (literals replaced
+by ``?``, whitespace collapsed, ``IN (?, ?, ...)`` folded). A statement slower
+than ``SLOW_QUERY_MS`` is logged once per occurrence together with its
+``EXPLAIN QUERY PLAN``, captured the first time it is slow and flagged when it
+scans a table without an index or sorts through a temp b-tree. Hooks can fire
+while the caller holds a pooled connection (and possibly the write lock), so a
+plan is captured, and that slow query logged, on a background thread after the
+statement has finished.
+
+Covered: ``execute_query``/``execute_query_one`` (and their async forms),
+``UnitOfWork`` statements and ``run`` callbacks, the group-commit writer and
+``transaction()`` blocks. Callback statements are timed up to their first row
+and report affected rows only for writes (see ``database.TracedConnection``).
+
+Not counted: the provider index refresh and the ``EXPLAIN`` queries run
+here, which use ``get_db_connection()`` directly, plus the BEGIN/COMMIT
+around each transaction.
+"""
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import database
+
+QUERY_DIAGNOSTICS = os.getenv("QUERY_DIAGNOSTICS", "0").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+# Distinct normalized statements tracked; later ones are counted under OVERFLOW
+QUERY_STATS_MAX_STATEMENTS = int(os.getenv("QUERY_STATS_MAX_STATEMENTS", "500"))
+OVERFLOW = "<other statements>"
+
+SORT_KEYS = ("total", "max", "mean", "count")
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(query: str) -> str:
+    query = _STRING.sub("?", query)
+    query = _NUMBER.sub("?", query)
+    query = _SPACE.sub(" ", query).strip()
+    return _IN_LIST.sub("IN (...)", query)
+
+
+def plan_warnings(plan: List[str]) -> List[str]:
+    """Plan lines worth an index: full table scans and sorts without one."""
+    warnings = []
+    for detail in plan:
+        # SQLite >= 3.36 prints "SCAN t", older versions "SCAN TABLE t"
+        if detail.startswith("SCAN ") and " USING " not in detail and "VIRTUAL TABLE" not in detail:
+            warnings.append(f"full table scan: {detail}")
+        elif detail.startswith("USE TEMP B-TREE"):
+            warnings.append(f"sort without index: {detail}")
+    return warnings
+
+
+def explain(query: str, params=None) -> List[str]:
+    """``EXPLAIN QUERY PLAN`` detail lines for ``query`` on a pooled connection."""
+    with database.get_db_connection() as conn:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + query, params or ()).fetchall()
+    return [row["detail"] for row in rows]
+
+
+class StatementStats:
+    __slots__ = ("statement", "count", "total", "max", "rows", "slow", "last_seen", "sample", "plan")
+
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.last_seen = 0.0
+        # Last (query, params) seen, so a plan can be captured on demand
+        self.sample = None
+        self.plan: Optional[List[str]] = None
+
+    def as_dict(self) -> dict:
+        warnings = plan_warnings(self.plan) if self.plan is not None else None
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+            "slow": self.slow,
+            "last_seen": self.last_seen,
+            "plan": self.plan,
+            "warnings": warnings,
+        }
+
+
+class QueryLog:
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, max_statements: int = QUERY_STATS_MAX_STATEMENTS):
+        self.slow_seconds = slow_ms / 1000
+        self.max_statements = max_statements
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pending_plans = queue.SimpleQueue()
+        self._thread = None
+
+    def record(self, query: str, params, seconds: float, rows: int):
+        """database query hook; runs on the thread that executed the statement."""
+        key = normalize(query)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    key = OVERFLOW
+                    stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = StatementStats(key)
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.rows += max(rows, 0)
+            stats.last_seen = time.time()
+            if key != OVERFLOW:
+                stats.sample = (query, params)
+            slow = seconds >= self.slow_seconds
+            if slow:
+                stats.slow += 1
+            need_plan = slow and stats.plan is None and key != OVERFLOW
+
+        if not slow:
+            return
+        if need_plan:
+            self._explain_later(stats, seconds, rows)
+        else:
+            self._log_slow(stats, seconds, rows)
+
+    def _explain_later(self, stats: StatementStats, seconds: float, rows: int):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._explain_loop, name="querylog-explain", daemon=True)
+                    thread.start()
+                    self._thread = thread
+        self._pending_plans.put((stats, seconds, rows))
+
+    def _explain_loop(self):
+        while True:
+            stats, seconds, rows = self._pending_plans.get()
+            try:
+                if stats.plan is None:
+                    self._capture_plan(stats)
+                self._log_slow(stats, seconds, rows)
+            except Exception:
+                logger.exception("Slow query plan capture failed")
+
+    def _log_slow(self, stats: StatementStats, seconds: float, rows: int):
+        warnings = plan_warnings(stats.plan) if stats.plan else []
+        logger.warning(
+            "Slow query (%.1f ms, %d rows): %s\n  plan: %s%s",
+            seconds * 1000,
+            rows,
+            stats.statement,
+            " | ".join(stats.plan or ["unavailable"]),
+            "".join(f"\n  WARNING {warning}" for warning in warnings),
+        )
+
+    def _capture_plan(self, stats: StatementStats):
+        query, params = stats.sample
+        try:
+            plan = explain(query, params)
+        except sqlite3.Error as exc:
+            plan = [f"EXPLAIN failed: {exc}"]
+        with self._lock:
+            stats.plan = plan
+
+    def top(self, limit: int = 20, sort: str = "total", explain_missing: bool = False) -> List[dict]:
+        """The ``limit`` statements with the highest ``sort`` (total, max, mean or count)."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+
+        def key(stats: StatementStats):
+            if sort == "mean":
+                return stats.total / stats.count
+            return getattr(stats, sort)
+
+        with self._lock:
+            ranked = sorted(self._stats.values(), key=key, reverse=True)[:limit]
+        if explain_missing:
+            for stats in ranked:
+                if stats.plan is None and stats.sample is not None:
+                    self._capture_plan(stats)
+        return [stats.as_dict() for stats in ranked]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_log = QueryLog()
+
+if QUERY_DIAGNOSTICS:
+    database.add_query_hook(query_log.record)
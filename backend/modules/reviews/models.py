@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional
+from datetime import datetime
+
+class ReviewCreate(BaseModel):
+    provider_id: str
+    rating: int = Field(..., ge=1, le=5)
+    comment: Optional[str] = Field(None, max_length=2000)
+
+class ReviewUpdate(BaseModel):
+    rating: Optional[int] = Field(None, ge=1, le=5)
+    comment: Optional[str] = Field(None, max_length=2000)
+
+    @field_validator("rating")
+    @classmethod
+    def rating_not_null(cls, value):
+        # Omit rating to keep it; an explicit null can't be stored
+        if value is None:
+            raise ValueError("rating cannot be null")
+        return value
+
+class Review(BaseModel):
+    id: str
+    provider_id: str
+    user_id: str
+    rating: int
+    comment: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
+from .models import Review, ReviewCreate, ReviewUpdate
+from .service import (
+    ReviewConflict,
+    create_review,
+    update_review,
+    delete_review,
+    list_reviews_page,
+)
+from ..auth import Principal, require_principal
+from database import UnitOfWork, get_unit_of_work
+
+router = APIRouter(tags=["reviews"])
+
+get_current_user = require_principal("customer")
+
+@router.post("/", response_model=Review, status_code=status.HTTP_201_CREATED)
+async def post_review(
+    review: ReviewCreate,
+    principal: Principal = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
+    """Review a provider (one review per customer and provider)"""
+    try:
+        created = await create_review(principal.id, review, uow)
+    except ReviewConflict:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You have already reviewed this provider"
+        )
+    if not created:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Provider not found"
+        )
+    await uow.commit()
+    return created
+
+@router.get("/", response_model=List[Review])
+async def get_provider_reviews(
+    provider_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """A provider's reviews, newest first; follow the ``X-Next-Cursor`` header to page"""
+    try:
+        reviews, next_cursor = await list_reviews_page(provider_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(reviews, headers=headers)
+
+@router.put("/{review_id}", response_model=Review)
+async def edit_review(
+    review_id: str,
+    review_update: ReviewUpdate,
+    principal: Principal = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
+    """Edit one of your own reviews"""
+    updated = await update_review(review_id, principal.id, review_update, uow)
+    if not updated:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Review not found"
+        )
+    await uow.commit()
+    return updated
+
+@router.delete("/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_review(
+    review_id: str,
+    principal: Principal = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
+    """Delete one of your own reviews"""
+    success = await delete_review(review_id, principal.id, uow)
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Review not found"
+        )
+    await uow.commit()
@@ -0,0 +1,215 @@
+"""Customer reviews of providers.
+
+``providers.rating_sum`` and ``providers.reviews_count`` are running totals:
+every review write adjusts them by its own delta, in the same transaction, and
+``providers.rating`` is set from them. Nothing on the request path aggregates
+over ``reviews``, and rating-sorted search keeps using the indexes on
+``providers.rating``. ``check_aggregates`` recomputes the totals in batches
+as a periodic safety net and repairs any provider that drifted.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+from .models import Review, ReviewCreate, ReviewUpdate
+from database import execute_query_async, transaction, UnitOfWork
+from .. import metrics
+from ..providers.service import invalidate_provider
+from ..serialization import row_converter, select_columns
+from ..utils import decode_cursor, next_cursor
+
+REVIEW_CHECK_INTERVAL_SECONDS = int(os.getenv("REVIEW_CHECK_INTERVAL_SECONDS", "86400"))
+# Providers checked per transaction, so the check never holds the write lock for long
+REVIEW_CHECK_BATCH_SIZE = int(os.getenv("REVIEW_CHECK_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+review_repairs = metrics.registry.counter(
+    "review_aggregate_repairs_total", "Providers whose rating totals the consistency check corrected.")
+
+COLUMNS = select_columns(Review)
+to_review = row_converter(Review)
+
+
+class ReviewConflict(Exception):
+    """The customer has already reviewed this provider."""
+
+
+def _apply_rating_delta(conn, provider_id: str, sum_delta: int, count_delta: int, now: datetime):
+    conn.execute(
+        """
+        UPDATE providers
+        SET rating_sum = rating_sum + ?,
+            reviews_count = reviews_count + ?,
+            rating = CASE WHEN reviews_count + ? > 0
+                          THEN (rating_sum + ?) * 1.0 / (reviews_count + ?)
+                          ELSE 0.0 END,
+            updated_at = ?
+        WHERE id = ?
+        """,
+        (sum_delta, count_delta, count_delta, sum_delta, count_delta, now, provider_id),
+    )
+
+
+def _create(conn, user_id: str, review: ReviewCreate) -> Optional[dict]:
+    if conn.execute("SELECT 1 FROM providers WHERE id = ?", (review.provider_id,)).fetchone() is None:
+        return None
+    if conn.execute(
+        "SELECT 1 FROM reviews WHERE provider_id = ? AND user_id = ?", (review.provider_id, user_id)
+    ).fetchone():
+        raise ReviewConflict()
+    now = datetime.utcnow()
+    row = conn.execute(
+        f"""
+        INSERT INTO reviews (id, provider_id, user_id, rating, comment, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        RETURNING {COLUMNS}
+        """,
+        (str(uuid.uuid4()), review.provider_id, user_id, review.rating, review.comment, now, now),
+    ).fetchone()
+    _apply_rating_delta(conn, review.provider_id, review.rating, 1, now)
+    return dict(row)
+
+
+async def create_review(user_id: str, review: ReviewCreate, uow: UnitOfWork) -> Optional[dict]:
+    """Add a review within ``uow``; None if the provider doesn't exist. Raises ReviewConflict."""
+    created = await uow.run(_create, user_id, review)
+    if created:
+        uow.after_commit(invalidate_provider, review.provider_id)
+    return created
+
+
+def _update(conn, review_id: str, user_id: str, update_data: dict) -> Optional[dict]:
+    old = conn.execute("SELECT provider_id, user_id, rating FROM reviews WHERE id = ?", (review_id,)).fetchone()
+    if old is None or old["user_id"] != user_id:
+        return None
+    now = datetime.utcnow()
+    update_data["updated_at"] = now
+    set_clause = ", ".join(f"{k} = ?" for k in update_data)
+    row = conn.execute(
+        f"UPDATE reviews SET {set_clause} WHERE id = ? RETURNING {COLUMNS}",
+        (*update_data.values(), review_id),
+    ).fetchone()
+    if row["rating"] != old["rating"]:
+        _apply_rating_delta(conn, old["provider_id"], row["rating"] - old["rating"], 0, now)
+    return dict(row)
+
+
+async def update_review(
+    review_id: str, user_id: str, review_data: ReviewUpdate, uow: UnitOfWork
+) -> Optional[dict]:
+    """Edit the customer's own review within ``uow``; None if they have no such review."""
+    updated = await uow.run(_update, review_id, user_id, review_data.model_dump(exclude_unset=True))
+    if updated:
+        uow.after_commit(invalidate_provider, updated["provider_id"])
+    return updated
+
+
+def _delete(conn, review_id: str, user_id: str) -> Optional[str]:
+    row = conn.execute(
+        "DELETE FROM reviews WHERE id = ? AND user_id = ? RETURNING provider_id, rating", (review_id, user_id)
+    ).fetchone()
+    if row is None:
+        return None
+    _apply_rating_delta(conn, row["provider_id"], -row["rating"], -1, datetime.utcnow())
+    return row["provider_id"]
+
+
+async def delete_review(review_id: str, user_id: str, uow: UnitOfWork) -> bool:
+    """Delete the customer's own review within ``uow``; False if they have no such review."""
+    provider_id = await uow.run(_delete, review_id, user_id)
+    if provider_id:
+        uow.after_commit(invalidate_provider, provider_id)
+    return bool(provider_id)
+
+
+def remove_user_reviews(conn, user_id: str) -> List[str]:
+    """Delete every review by ``user_id`` within the caller's transaction; the providers affected."""
+    rows = conn.execute(
+        "DELETE FROM reviews WHERE user_id = ? RETURNING provider_id, rating", (user_id,)
+    ).fetchall()
+    now = datetime.utcnow()
+    for row in rows:
+        _apply_rating_delta(conn, row["provider_id"], -row["rating"], -1, now)
+    return [row["provider_id"] for row in rows]
+
+
+async def list_reviews_page(
+    provider_id: str, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Newest-first page of a provider's reviews plus the cursor for the next page.
+
+    Keyset seek on (provider_id, created_at, id); raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = f"""
+        SELECT {COLUMNS} FROM reviews
+        WHERE provider_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+        """
+        results = await execute_query_async(query, (provider_id, created_at, last_id, limit))
+    else:
+        query = f"""
+        SELECT {COLUMNS} FROM reviews
+        WHERE provider_id = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+        """
+        results = await execute_query_async(query, (provider_id, limit))
+    return [to_review(row) for row in results], next_cursor(results, limit)
+
+
+def check_aggregates(batch_size: int = REVIEW_CHECK_BATCH_SIZE) -> int:
+    """Recompute rating totals from ``reviews`` and repair providers that drifted; the number repaired."""
+    repaired = 0
+    last_rowid = 0
+    while True:
+        fixed = []
+        with transaction() as conn:
+            providers = conn.execute(
+                """
+                SELECT rowid, id, rating, rating_sum, reviews_count FROM providers
+                WHERE rowid > ? ORDER BY rowid LIMIT ?
+                """,
+                (last_rowid, batch_size),
+            ).fetchall()
+            if not providers:
+                break
+            last_rowid = providers[-1]["rowid"]
+            ids = [provider["id"] for provider in providers]
+            placeholders = ", ".join("?" for _ in ids)
+            actual = {
+                row["provider_id"]: (row["total"], row["count"])
+                for row in conn.execute(
+                    f"""
+                    SELECT provider_id, sum(rating) AS total, count(*) AS count FROM reviews
+                    WHERE provider_id IN ({placeholders}) GROUP BY provider_id
+                    """,
+                    ids,
+                )
+            }
+            now = datetime.utcnow()
+            for provider in providers:
+                total, count = actual.get(provider["id"], (0, 0))
+                rating = total / count if count else 0.0
+                if (provider["rating_sum"], provider["reviews_count"]) == (total, count) \
+                        and abs((provider["rating"] or 0.0) - rating) < 1e-9:
+                    continue
+                logger.warning(
+                    "Repairing rating totals of provider %s: sum %s -> %s, count %s -> %s",
+                    provider["id"], provider["rating_sum"], total, provider["reviews_count"], count,
+                )
+                conn.execute(
+                    "UPDATE providers SET rating_sum = ?, reviews_count = ?, rating = ?, updated_at = ? WHERE id = ?",
+                    (total, count, rating, now, provider["id"]),
+                )
+                fixed.append(provider["id"])
+        for provider_id in fixed:
+            invalidate_provider(provider_id)
+        if fixed:
+            review_repairs.inc(amount=len(fixed))
+        repaired += len(fixed)
+    return repaired
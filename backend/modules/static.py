@@ -0,0 +1,209 @@
+"""Static file serving for uploaded images.
+
+Extends Starlette's StaticFiles with:
+
+* strong ETags, taken from the content hash for blob-store paths and from
+  size/mtime for everything else;
+* ``Cache-Control: immutable`` for content-addressed paths, whose bytes can
+  never change under the same URL;
+* ``If-None-Match``/``If-Modified-Since`` handling, with ``If-None-Match``
+  winning as RFC 9110 requires;
+* single byte ranges with ``If-Range``;
+* precompressed ``.br``/``.gz`` siblings chosen by ``Accept-Encoding``;
+* the ASGI ``pathsend``/``zerocopy`` extensions when the server offers them,
+  falling back to chunked reads on a worker thread.
+"""
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from .conditional import etag_matches
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "public, max-age=300")
+CHUNK_SIZE = 256 * 1024
+
+# blobs/<aa>/<bb>/<sha256>[.<variant>].<ext>; the tag covers the variant too
+_CONTENT_HASHED = re.compile(r"(?:^|/)blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64}(?:\.[a-z]+)?)\.[a-z0-9]+$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Accept-Encoding token -> (sibling suffix, Content-Encoding)
+PRECOMPRESSED = (("br", ".br", "br"), ("gzip", ".gz", "gzip"))
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) for a single satisfiable range.
+
+    Returns None when the header should be ignored (malformed or multi-range,
+    which we answer with the full body) and raises 416 when unsatisfiable.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = max(size - length, 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+class StaticFileResponse(Response):
+    """Sends ``length`` bytes of ``path`` starting at ``offset``."""
+
+    def __init__(self, path: str, offset: int, length: int, whole_file: bool, status_code: int,
+                 headers: dict, media_type: str, send_body: bool):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.whole_file = whole_file
+        self.send_body = send_body
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        extensions = scope.get("extensions") or {}
+        if self.whole_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if "http.response.zerocopy" in extensions:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file.wrapped,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                # File shrank underneath us; end the body rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        full_path = os.fspath(full_path)
+        if os.path.basename(full_path).startswith("."):
+            # In-flight temp files from uploads and variant rendering
+            raise HTTPException(status_code=404)
+
+        request_headers = Headers(scope=scope)
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+        relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        hashed = _CONTENT_HASHED.search(relative)
+
+        serve_path, served_stat, encoding = full_path, stat_result, None
+        accept_encoding = request_headers.get("accept-encoding", "")
+        for coding, suffix, content_encoding in PRECOMPRESSED:
+            if not _accepts(accept_encoding, coding):
+                continue
+            try:
+                sibling_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if stat.S_ISREG(sibling_stat.st_mode):
+                serve_path, served_stat, encoding = full_path + suffix, sibling_stat, content_encoding
+                break
+
+        if hashed:
+            tag = hashed.group(1)
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            tag = f"{int(stat_result.st_mtime_ns):x}-{stat_result.st_size:x}"
+            cache_control = DEFAULT_CACHE_CONTROL
+        etag = f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+        headers = {
+            "etag": etag,
+            "last-modified": last_modified,
+            "cache-control": cache_control,
+            "accept-ranges": "bytes",
+            "vary": "Accept-Encoding",
+        }
+        if encoding:
+            headers["content-encoding"] = encoding
+
+        if self._not_modified(request_headers, etag, stat_result.st_mtime):
+            return Response(status_code=304, headers=headers)
+
+        size = served_stat.st_size
+        start, end = 0, size - 1
+        range_header = request_headers.get("range")
+        if range_header and status_code == 200 and self._if_range_ok(request_headers, etag, last_modified):
+            byte_range = _parse_range(range_header, size)
+            if byte_range is not None:
+                start, end = byte_range
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        return StaticFileResponse(
+            serve_path,
+            offset=start,
+            length=max(end - start + 1, 0),
+            whole_file=status_code != 206,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            send_body=scope["method"] != "HEAD",
+        )
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, mtime: float) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def _if_range_ok(request_headers: Headers, etag: str, last_modified: str) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        # If-Range needs a strong match
+        return if_range.strip() in (etag, last_modified)
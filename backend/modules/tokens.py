@@ -0,0 +1,110 @@
+"""Long-lived, rotating refresh tokens.
+
+A refresh token is an opaque random string; only its SHA-256 is stored, so a
+database leak doesn't hand out sessions. Looking one up is a seek on the
+unique ``token_hash`` index. Every refresh revokes the presented token and
+issues its replacement in the same family. Presenting a token that was
+already replaced means it leaked (or a client raced itself), and the whole
+family is revoked.
+"""
+import hashlib
+import logging
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from pydantic import BaseModel
+from database import transaction
+from .writer import writer
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# Revoked rows are kept this long for reuse detection before being purged
+REFRESH_TOKEN_RETAIN_REVOKED_DAYS = float(os.getenv("REFRESH_TOKEN_RETAIN_REVOKED_DAYS", "7"))
+REFRESH_TOKEN_PURGE_INTERVAL_SECONDS = int(os.getenv("REFRESH_TOKEN_PURGE_INTERVAL_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _insert(conn, user_type: str, principal_id: str, family_id: Optional[str] = None) -> Tuple[str, str]:
+    token = secrets.token_urlsafe(32)
+    token_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    conn.execute(
+        """
+        INSERT INTO refresh_tokens (id, token_hash, family_id, user_type, principal_id, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (token_id, _hash(token), family_id or token_id, user_type, principal_id,
+         now, now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)),
+    )
+    return token_id, token
+
+
+async def issue_refresh_token(user_type: str, principal_id: str) -> str:
+    """Start a new token family for a fresh login."""
+    _, token = await writer.run(_insert, user_type, principal_id)
+    return token
+
+
+def _rotate(conn, token: str, user_type: str) -> Optional[Tuple[str, str]]:
+    # Returns (principal_id, new token), or None; never raises for a bad token so
+    # a family revocation isn't rolled back with the writer's savepoint
+    row = conn.execute(
+        "SELECT id, family_id, user_type, principal_id, expires_at, revoked_at, replaced_by"
+        " FROM refresh_tokens WHERE token_hash = ?",
+        (_hash(token),),
+    ).fetchone()
+    if row is None or row["user_type"] != user_type:
+        return None
+    now = datetime.utcnow()
+    if row["revoked_at"] is not None:
+        if row["replaced_by"] is None:
+            return None  # revoked explicitly, not rotated
+        conn.execute(
+            "UPDATE refresh_tokens SET revoked_at = ? WHERE family_id = ? AND revoked_at IS NULL",
+            (now, row["family_id"]),
+        )
+        logger.warning("Reused refresh token for %s %s; revoked its family", user_type, row["principal_id"])
+        return None
+    if datetime.fromisoformat(row["expires_at"]) <= now:
+        return None
+    new_id, new_token = _insert(conn, user_type, row["principal_id"], row["family_id"])
+    conn.execute(
+        "UPDATE refresh_tokens SET revoked_at = ?, replaced_by = ? WHERE id = ?",
+        (now, new_id, row["id"]),
+    )
+    return row["principal_id"], new_token
+
+
+async def rotate_refresh_token(token: str, user_type: str) -> Optional[Tuple[str, str]]:
+    """Exchange a valid refresh token for a new one: (principal id, new token), or None."""
+    return await writer.run(_rotate, token, user_type)
+
+
+def revoke_principal_tokens(conn, user_type: str, principal_id: str):
+    """Revoke every refresh token of an account within the caller's transaction."""
+    conn.execute(
+        "UPDATE refresh_tokens SET revoked_at = ? WHERE user_type = ? AND principal_id = ? AND revoked_at IS NULL",
+        (datetime.utcnow(), user_type, principal_id),
+    )
+
+
+def purge_expired() -> int:
+    """Delete expired tokens and revoked ones past the reuse-detection window; the number deleted."""
+    now = datetime.utcnow()
+    retain_until = now - timedelta(days=REFRESH_TOKEN_RETAIN_REVOKED_DAYS)
+    with transaction() as conn:
+        expired = conn.execute("DELETE FROM refresh_tokens WHERE expires_at < ?", (now,)).rowcount
+        revoked = conn.execute(
+            "DELETE FROM refresh_tokens WHERE revoked_at IS NOT NULL AND revoked_at < ?", (retain_until,)
+        ).rowcount
+    return expired + revoked
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from . import blobstore, metrics
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Whole multipart request body: the most files one form takes (provider
+# business details: three images) plus room for the other fields
+MAX_MULTIPART_BYTES = int(os.getenv("MAX_MULTIPART_BYTES", str(3 * MAX_UPLOAD_BYTES + 1024 * 1024)))
+
+# Declared content type -> accepted leading bytes of the file
+ALLOWED_IMAGE_TYPES = {
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/gif": (b"GIF87a", b"GIF89a"),
+    "image/webp": (b"RIFF",),
+}
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+def _check_signature(content_type: str, head: bytes):
+    signatures = ALLOWED_IMAGE_TYPES[content_type]
+    valid = any(head.startswith(sig) for sig in signatures)
+    if content_type == "image/webp":
+        valid = valid and head[8:12] == b"WEBP"
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"File content does not match {content_type}",
+        )
+
+
+def _stream_to_temp(source: BinaryIO, content_type: str) -> Tuple[str, str, int]:
+    """Copy ``source`` into a temp file chunk by chunk; runs on a worker thread.
+
+    The per-file size and signature checks run as the data is copied, and the
+    SHA-256 is computed along the way. Returns (temp path, hex digest, size).
+
+    Starlette has already parsed and spooled the multipart body by the time
+    this runs, so these checks don't bound what was received; the body as a
+    whole is capped while it arrives by ``MultipartSizeLimitMiddleware``.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=blobstore.BLOB_DIR, prefix=".upload-")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0:
+                    _check_signature(content_type, chunk)
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte limit",
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+async def save_upload(file: UploadFile) -> str:
+    """Validate and store an uploaded image in the blob store, returning its public URL."""
+    content_type = (file.content_type or "").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported file type: {file.content_type}",
+        )
+    tmp_path, digest, size = await run_in_threadpool(_stream_to_temp, file.file, content_type)
+    metrics.upload_bytes.observe(content_type, value=size)
+    metrics.upload_bytes_total.inc(content_type, amount=size)
+    return await blobstore.store(tmp_path, digest, IMAGE_EXTENSIONS[content_type], size)
+
+
+async def save_uploads(*files: Optional[UploadFile]) -> list:
+    """Save several uploads concurrently; ``None`` entries map to ``None``."""
+
+    async def save(file):
+        return await save_upload(file) if file is not None else None
+
+    return list(await asyncio.gather(*(save(file) for file in files)))
+
+
+class MultipartSizeLimitMiddleware:
+    """Rejects multipart request bodies over ``max_bytes`` with a 413 before they are spooled.
+
+    A declared Content-Length over the limit is refused without reading the
+    body; otherwise bytes are counted as they are received, which also covers
+    chunked requests. Other content types (NDJSON imports) are not limited.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int = MAX_MULTIPART_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body exceeds the {self.max_bytes} byte limit",
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").lower().startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            error = self._too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the form is parsed; FastAPI turns it into the response
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
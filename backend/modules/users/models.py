@@ -24,6 +24,14 @@ class UserInDB(UserBase):
     updated_at: datetime
     is_active: bool = True
 
+class UserImport(UserBase):
+    """One NDJSON line of a bulk user import"""
+    id: Optional[str] = None
+    password: str  # plaintext, or an existing bcrypt hash which is kept as-is
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -1,69 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
-from typing import List
+from typing import List, Optional
 from .models import UserCreate, UserUpdate, UserInDB
 from .service import (
     create_user,
     get_user_by_email,
     update_user,
     delete_user,
-    list_users,
+    list_users_page,
+    list_users_page_validators,
+    get_user_updated_at,
     verify_password,
     get_password_hash,
-    create_access_token,
-    ACCESS_TOKEN_EXPIRE_MINUTES,
     get_user_by_id,
-    verify_token
+    export_users,
+    import_users,
+)
+from ..auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    create_access_token,
+    load_principal,
+    Principal,
+    require_admin,
+    require_principal,
 )
+from ..admission import admit_login, admit_registration
+from ..tokens import RefreshRequest, issue_refresh_token, rotate_refresh_token
+from ..conditional import (
+    has_conditions,
+    is_not_modified,
+    not_modified,
+    page_etag,
+    page_last_modified,
+    row_etag,
+    validator_headers,
+)
+from database import UnitOfWork, get_unit_of_work
 
 router = APIRouter(tags=["users"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    token_data = verify_token(token)
-    if not token_data or token_data.get("user_type") != "customer":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    user = get_user_by_email(token_data.get("sub"))
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    return user
+# The authenticated customer, resolved from cached token claims and principal
+get_current_user = require_principal("customer")
 
-@router.post("/register", response_model=dict)
-def register_customer(user: UserCreate):
+@router.post("/register", response_model=dict, dependencies=[Depends(admit_registration)])
+async def register_customer(user: UserCreate):
     """Register a new customer"""
     # Check if user already exists
-    if get_user_by_email(user.email):
+    if await get_user_by_email(user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Create new user
-    user.password = get_password_hash(user.password)
-    create_user(user)
+    user.password = await get_password_hash(user.password)
+    created = await create_user(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email, "user_type": "customer"},
+        data={"sub": user.email, "user_type": "customer", "user_id": created.id},
         expires_delta=access_token_expires
     )
+    refresh_token = await issue_refresh_token("customer", created.id)
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
-@router.post("/login", response_model=dict)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+@router.post("/login", response_model=dict, dependencies=[Depends(admit_login)])
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login for customers"""
-    user = get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user["password"]):
+    user = await get_user_by_email(form_data.username)
+    if not user or not await verify_password(form_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -72,15 +81,44 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"], "user_type": "customer"},
+        data={"sub": user["email"], "user_type": "customer", "user_id": user["id"]},
         expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = await issue_refresh_token("customer", user["id"])
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
-@router.get("/{user_id}", response_model=UserInDB)
-def get_user_details(user_id: str):
-    """Get user details by ID"""
-    user = get_user_by_id(user_id)
+@router.post("/refresh", response_model=dict)
+async def refresh(body: RefreshRequest):
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    rotated = await rotate_refresh_token(body.refresh_token, "customer")
+    principal = await load_principal("customer", rotated[0]) if rotated else None
+    if principal is None or not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    access_token = create_access_token(
+        data={"sub": principal.email, "user_type": "customer", "user_id": principal.id},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": rotated[1]}
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+async def export_all_users(include_password: bool = False):
+    """Stream every user as NDJSON (admin only)"""
+    return StreamingResponse(export_users(include_password), media_type="application/x-ndjson")
+
+@router.post("/import", dependencies=[Depends(require_admin)])
+async def import_all_users(request: Request, upsert: bool = False):
+    """Bulk-insert users from an NDJSON request body (admin only)"""
+    return await import_users(request.stream(), upsert=upsert)
+
+@router.get("/me", response_model=UserInDB)
+async def get_my_details(principal: Principal = Depends(get_current_user)):
+    """Get the authenticated customer's details"""
+    user = await get_user_by_id(principal.id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -88,40 +126,65 @@ def get_user_details(user_id: str):
         )
     return user
 
-@router.put("/{user_id}", response_model=UserInDB)
-def update_user_details(user_id: str, user_update: UserUpdate):
-    """Update user details by ID"""
-    user = get_user_by_id(user_id)
+@router.get("/{user_id}", response_model=UserInDB)
+async def get_user_details(user_id: str, request: Request, response: Response):
+    """Get user details by ID; supports If-None-Match and If-Modified-Since"""
+    if has_conditions(request.headers):
+        updated_at = await get_user_updated_at(user_id)
+        if updated_at is not None:
+            etag = row_etag(user_id, updated_at)
+            if is_not_modified(request.headers, etag, updated_at):
+                return not_modified(validator_headers(etag, updated_at))
+    user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    updated_user = update_user(user_id, user_update)
+    response.headers.update(validator_headers(row_etag(user["id"], user["updated_at"]), user["updated_at"]))
+    return user
+
+@router.put("/{user_id}", response_model=UserInDB)
+async def update_user_details(
+    user_id: str, user_update: UserUpdate, uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    """Update user details by ID"""
+    updated_user = await update_user(user_id, user_update, uow)
     if not updated_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    await uow.commit()
     return updated_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_account(user_id: str):
+async def delete_user_account(user_id: str, uow: UnitOfWork = Depends(get_unit_of_work)):
     """Delete user account by ID"""
-    user = get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    success = delete_user(user_id)
+    success = await delete_user(user_id, uow)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    await uow.commit()
 
 @router.get("/", response_model=List[UserInDB])
-def get_all_users(skip: int = 0, limit: int = 100):
-    """List all users"""
-    return list_users(skip=skip, limit=limit) 
\ No newline at end of file
+async def get_all_users(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """List all users, newest first; follow the ``X-Next-Cursor`` header to page"""
+    try:
+        if has_conditions(request.headers):
+            rows, next_cursor = await list_users_page_validators(limit=limit, cursor=cursor, skip=skip)
+            etag = page_etag(rows)
+            if is_not_modified(request.headers, etag):
+                headers = validator_headers(etag, page_last_modified(rows))
+                if next_cursor:
+                    headers["X-Next-Cursor"] = next_cursor
+                return not_modified(headers)
+        users, next_cursor = await list_users_page(limit=limit, cursor=cursor, skip=skip)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    headers = validator_headers(page_etag(users), page_last_modified(users))
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return ORJSONResponse(users, headers=headers) 
\ No newline at end of file
@@ -1,51 +1,58 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
-from typing import Optional, List
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from .models import UserCreate, UserUpdate, UserInDB
-from database import execute_query, execute_query_one
+from typing import AsyncIterator, Optional, List, Tuple
+from .models import UserCreate, UserUpdate, UserInDB, UserImport
+from database import execute_query_async, execute_query_one_async, UnitOfWork
+from ..passwords import verify_password, get_password_hash
+from ..utils import next_cursor, page_query
+from ..cache import TTLCache
+from ..auth import invalidate_principal
+from ..bulk import export_ndjson, import_ndjson
+from ..writer import writer
+from ..tokens import revoke_principal_tokens
+from ..reviews.service import remove_user_reviews
+from ..providers.service import invalidate_provider
+from ..serialization import row_converter, select_columns
 from dotenv import load_dotenv
 import os
 load_dotenv()
 
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def verify_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+# Read-through caches of user rows: id -> row, and email -> id (validated on read).
+# Callers get a shallow copy so they can't mutate the cached row.
+user_cache = TTLCache("users")
+user_email_cache = TTLCache("user_emails")
+
+def invalidate_user(user_id: str):
+    user_cache.invalidate(user_id)
+    invalidate_principal("customer", user_id)
 
-def get_user_by_email(email: str) -> Optional[dict]:
-    return execute_query_one("SELECT * FROM users WHERE email = ?", (email,))
+async def get_user_by_email(email: str) -> Optional[dict]:
+    user_id = user_email_cache.get(email)
+    if user_id is not None:
+        user = await get_user_by_id(user_id)
+        if user and user["email"] == email:
+            return user
+        user_email_cache.invalidate(email)
+    generation = user_cache.generation()
+    user = await execute_query_one_async("SELECT * FROM users WHERE email = ?", (email,))
+    if not user:
+        return None
+    user_cache.set(user["id"], user, generation=generation)
+    user_email_cache.set(email, user["id"])
+    return dict(user)
 
-def get_user_by_id(user_id: str) -> Optional[dict]:
-    return execute_query_one("SELECT * FROM users WHERE id = ?", (user_id,))
+async def get_user_by_id(user_id: str) -> Optional[dict]:
+    user = user_cache.get(user_id)
+    if user is None:
+        # Taken before the read, so a write committed meanwhile keeps its row out of the cache
+        generation = user_cache.generation()
+        user = await execute_query_one_async("SELECT * FROM users WHERE id = ?", (user_id,))
+        if not user:
+            return None
+        user_cache.set(user_id, user, generation=generation)
+    return dict(user)
 
-def create_user(user: UserCreate) -> UserInDB:
+async def create_user(user: UserCreate) -> UserInDB:
     query = """
     INSERT INTO users (id, email, full_name, password, created_at, updated_at)
     VALUES (?, ?, ?, ?, ?, ?)
@@ -53,7 +60,7 @@ def create_user(user: UserCreate) -> UserInDB:
     """
     now = datetime.utcnow()
     user_id = str(uuid.uuid4())
-    result = execute_query_one(
+    result = await writer.execute_one(
         query,
         (user_id, user.email, user.full_name, user.password, now, now)
     )
@@ -61,36 +68,83 @@ def create_user(user: UserCreate) -> UserInDB:
         raise Exception("User creation failed: No result returned from database. Check for constraint violations or DB triggers.")
     return UserInDB(**result)
 
-def update_user(user_id: str, user_data: UserUpdate) -> Optional[dict]:
-    user = get_user_by_id(user_id)
-    if not user:
-        return None
-    
+async def update_user(user_id: str, user_data: UserUpdate, uow: UnitOfWork) -> Optional[dict]:
+    """Update a user within ``uow``; None if there is no such user."""
     update_data = user_data.dict(exclude_unset=True)
     if not update_data:
-        return user
+        return await get_user_by_id(user_id)
     
     update_data["updated_at"] = datetime.utcnow()
     
-    # Build dynamic update query
+    # Build dynamic update query; RETURNING saves re-reading the row
     set_clause = ", ".join(f"{k} = ?" for k in update_data.keys())
-    query = f"UPDATE users SET {set_clause} WHERE id = ?"
-    
-    # Execute update
-    execute_query(query, (*update_data.values(), user_id))
+    query = f"UPDATE users SET {set_clause} WHERE id = ? RETURNING *"
     
-    return get_user_by_id(user_id)
+    user = await uow.execute_one(query, (*update_data.values(), user_id))
+    if user:
+        uow.after_commit(invalidate_user, user_id)
+    return user
 
-def delete_user(user_id: str) -> bool:
-    user = get_user_by_id(user_id)
-    if not user:
-        return False
-    
-    execute_query("DELETE FROM users WHERE id = ?", (user_id,))
-    return True
+async def delete_user(user_id: str, uow: UnitOfWork) -> bool:
+    """Delete a user within ``uow``; False if there was no such user."""
+    deleted = await uow.execute_one("DELETE FROM users WHERE id = ? RETURNING id", (user_id,))
+    if deleted:
+        await uow.run(revoke_principal_tokens, "customer", user_id)
+        for provider_id in await uow.run(remove_user_reviews, user_id):
+            uow.after_commit(invalidate_provider, provider_id)
+        uow.after_commit(invalidate_user, user_id)
+    return bool(deleted)
+
+# List endpoints select only public columns and skip per-row model validation
+PUBLIC_COLUMNS = select_columns(UserInDB)
+to_public = row_converter(UserInDB)
 
-def list_users(skip: int = 0, limit: int = 100) -> List[UserInDB]:
+async def list_users(skip: int = 0, limit: int = 100) -> List[UserInDB]:
     """List all users with pagination"""
-    query = "SELECT * FROM users ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    results = execute_query(query, (limit, skip))
-    return [UserInDB(**row) for row in results] 
\ No newline at end of file
+    users, _ = await list_users_page(limit=limit, skip=skip)
+    return [UserInDB(**row) for row in users]
+
+async def list_users_page(
+    limit: int = 100, cursor: Optional[str] = None, skip: int = 0
+) -> Tuple[List[dict], Optional[str]]:
+    """Newest-first page of users as JSON-ready dicts plus the cursor for the next page (keyset on created_at, id)"""
+    query, params = page_query("users", PUBLIC_COLUMNS, limit, cursor, skip)
+    results = await execute_query_async(query, params)
+    # Before to_public, which rewrites created_at in place
+    after = next_cursor(results, limit)
+    return [to_public(row) for row in results], after
+
+async def list_users_page_validators(
+    limit: int = 100, cursor: Optional[str] = None, skip: int = 0
+) -> Tuple[List[dict], Optional[str]]:
+    """``id``, ``created_at`` and ``updated_at`` of the same page, read from the index alone."""
+    query, params = page_query("users", "id, created_at, updated_at", limit, cursor, skip)
+    results = await execute_query_async(query, params)
+    return results, next_cursor(results, limit)
+
+async def get_user_updated_at(user_id: str) -> Optional[str]:
+    """A user's ``updated_at`` (for conditional requests).
+
+    The planner would pick the unique index on ``id`` and then read the table
+    row; the covering index answers from the index alone.
+    """
+    row = await execute_query_one_async(
+        "SELECT updated_at FROM users INDEXED BY idx_users_id_updated_at WHERE id = ?", (user_id,)
+    )
+    return row["updated_at"] if row else None
+
+EXPORT_COLUMNS = ("id", "email", "full_name", "created_at", "updated_at", "is_active")
+IMPORT_COLUMNS = ("id", "email", "full_name", "password", "is_active", "created_at", "updated_at")
+
+def export_users(include_password: bool = False) -> AsyncIterator[str]:
+    """All users as NDJSON, oldest first, read in keyset batches"""
+    columns = EXPORT_COLUMNS + (("password",) if include_password else ())
+    return export_ndjson("users", columns, bool_columns=("is_active",))
+
+async def import_users(chunks: AsyncIterator[bytes], upsert: bool = False) -> dict:
+    report = await import_ndjson(
+        chunks, UserImport, "users", IMPORT_COLUMNS, upsert=upsert, on_written=invalidate_user
+    )
+    user_cache.clear()
+    user_email_cache.clear()
+    return report
@@ -1,6 +1,78 @@
-from passlib.context import CryptContext
+import asyncio
+import base64
+import json
+import logging
+from typing import Callable, List, Optional, Tuple
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from fastapi.concurrency import run_in_threadpool
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password) 
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+def encode_cursor(created_at, row_id: str) -> str:
+    """Opaque pagination cursor for the (created_at, id) keyset."""
+    raw = json.dumps([str(created_at), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+
+def page_query(table: str, columns: str, limit: int, cursor: Optional[str], skip: int) -> Tuple[str, tuple]:
+    """Newest-first page of ``table``: a keyset seek on (created_at, id) after ``cursor``, else OFFSET ``skip``.
+
+    Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = f"""
+        SELECT {columns} FROM {table}
+        WHERE (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+        """
+        return query, (created_at, last_id, limit)
+    query = f"SELECT {columns} FROM {table} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+    return query, (limit, skip)
+
+
+def next_cursor(results: List[dict], limit: int) -> Optional[str]:
+    """Cursor after the last row of a full page, None on the last page.
+
+    Call it before rows are rewritten for output (``to_public`` changes created_at).
+    """
+    if results and len(results) == limit:
+        return encode_cursor(results[-1]["created_at"], results[-1]["id"])
+    return None
+
+
+async def run_periodically(
+    func: Callable,
+    interval: float,
+    name: str,
+    report: Optional[str] = None,
+    level: int = logging.INFO,
+    immediately: bool = False,
+):
+    """Run ``func()`` on the threadpool every ``interval`` seconds until cancelled.
+
+    Failures are logged as "<name> failed" and the loop carries on. With
+    ``report``, a truthy result is logged as ``report % result`` at ``level``.
+    """
+    if not immediately:
+        await asyncio.sleep(interval)
+    while True:
+        try:
+            result = await run_in_threadpool(func)
+            if report and result:
+                logger.log(level, report, result)
+        except Exception:
+            logger.exception("%s failed", name)
+        await asyncio.sleep(interval)
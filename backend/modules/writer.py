@@ -0,0 +1,188 @@
+"""Group commit: one writer thread batches standalone writes into shared transactions.
+
+Each write is queued with a future. The writer thread takes everything queued
+(waiting up to ``WRITE_BATCH_WINDOW_MS`` for stragglers, at most
+``WRITE_BATCH_MAX`` items), runs the batch inside one BEGIN IMMEDIATE ...
+COMMIT with a SAVEPOINT around every item, and then resolves each future with
+that item's own result or error. A failing item is rolled back to its
+savepoint without affecting the others; if the COMMIT itself fails every
+caller in the batch gets the error. Callers only see their result once it is
+durable, and N concurrent writes cost one commit (one WAL fsync) instead of N.
+
+Multi-statement request transactions keep using ``database.UnitOfWork``; this
+is for writes that stand on their own (registrations, background updates).
+"""
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import database
+from . import metrics
+
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "2"))
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "256"))
+
+logger = logging.getLogger(__name__)
+
+write_batch_size = metrics.registry.histogram(
+    "db_write_batch_size", "Writes committed together by the group-commit writer.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+write_commit_latency = metrics.registry.histogram(
+    "db_write_commit_duration_seconds", "Group-commit batch time from BEGIN to COMMIT.",
+    buckets=metrics.QUERY_BUCKETS)
+
+_STOP = object()
+
+
+def _resolve(future: asyncio.Future, result, error: Optional[BaseException]):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _statement(conn: sqlite3.Connection, query: str, params, fetch_one: bool):
+    start = time.perf_counter()
+    cur = conn.execute(query, params or ())
+    if fetch_one:
+        row = cur.fetchone()
+        result = dict(row) if row else None
+        rows = 1 if row else 0
+    else:
+        result = [dict(row) for row in cur.fetchall()]
+        rows = len(result) if cur.description else cur.rowcount
+    if database.query_hooks:
+        database._run_query_hooks(query, params, time.perf_counter() - start, rows)
+    return result
+
+
+class GroupCommitWriter:
+    def __init__(self, window_ms: float = WRITE_BATCH_WINDOW_MS, max_batch: int = WRITE_BATCH_MAX):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                    thread.start()
+                    self._thread = thread
+
+    async def run(self, func, *args):
+        """Run ``func(conn, *args)`` in the next group-committed transaction and return its result."""
+        return await self._submit(database.call_traced, func, *args)
+
+    async def _submit(self, func, *args):
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((func, args, loop, future))
+        return await future
+
+    async def execute(self, query, params=None) -> list:
+        """Rows returned by a write (``RETURNING``), once it has been committed."""
+        return await self._submit(_statement, query, params, False)
+
+    async def execute_one(self, query, params=None) -> Optional[dict]:
+        return await self._submit(_statement, query, params, True)
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _loop(self):
+        conn = None
+        while True:
+            batch = self._collect(self._queue.get())
+            stopping = batch[-1] is _STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                try:
+                    if conn is None:
+                        conn = database._open_connection()
+                    self._commit_batch(conn, batch)
+                except Exception:
+                    logger.exception("Group commit writer failed")
+                    if conn is not None and not database._is_usable(conn):
+                        conn.close()
+                        conn = None
+            if stopping:
+                if conn is not None:
+                    conn.close()
+                return
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: list):
+        outcomes = []
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, _, _ in batch:
+                conn.execute("SAVEPOINT write_item")
+                try:
+                    result = func(conn, *args)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO write_item")
+                    conn.execute("RELEASE write_item")
+                    outcomes.append((None, exc))
+                else:
+                    conn.execute("RELEASE write_item")
+                    outcomes.append((result, None))
+            conn.commit()
+        except Exception as exc:
+            outcomes = [(None, exc)] * len(batch)
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            # Resolve every caller, including when BEGIN/COMMIT failed
+            for (_, _, loop, future), (result, error) in zip(batch, outcomes):
+                try:
+                    loop.call_soon_threadsafe(_resolve, future, result, error)
+                except RuntimeError:
+                    pass  # the caller's event loop has already closed
+            write_batch_size.observe(value=len(batch))
+            write_commit_latency.observe(value=time.perf_counter() - start)
+            self._batches += 1
+            self._writes += len(batch)
+
+    def stop(self, timeout: float = 5):
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self._batches,
+            "writes": self._writes,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+        }
+
+
+writer = GroupCommitWriter()
@@ -23,9 +23,152 @@ CREATE TABLE IF NOT EXISTS providers (
     working_hours TEXT,
     rating REAL DEFAULT 0.0,
     reviews_count INTEGER DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
     is_verified BOOLEAN DEFAULT 0,
     image TEXT DEFAULT '/images/placeholder.jpg',
     created_at TIMESTAMP NOT NULL,
     updated_at TIMESTAMP NOT NULL,
-    is_active BOOLEAN DEFAULT 1
-); 
\ No newline at end of file
+    is_active BOOLEAN DEFAULT 1,
+    sa_front_id TEXT,
+    sa_back_id TEXT,
+    profile_photo TEXT,
+    profile_photo_thumb TEXT,
+    profile_photo_medium TEXT,
+    change_seq INTEGER
+); 
+
+-- Keyset pagination: ORDER BY created_at DESC, id DESC. updated_at is included so
+-- a page's ETag can be computed from the index alone.
+CREATE INDEX IF NOT EXISTS idx_users_page ON users (created_at DESC, id DESC, updated_at);
+CREATE INDEX IF NOT EXISTS idx_providers_page ON providers (created_at DESC, id DESC, updated_at);
+
+-- Covering indexes for single-row ETag / Last-Modified checks
+CREATE INDEX IF NOT EXISTS idx_users_id_updated_at ON users (id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_providers_id_updated_at ON providers (id, updated_at);
+
+-- Provider search: equality on service_type/is_active, then range or sort on rating/hourly_rate
+CREATE INDEX IF NOT EXISTS idx_providers_type_rating ON providers (service_type, is_active, rating DESC, id);
+CREATE INDEX IF NOT EXISTS idx_providers_type_rate ON providers (service_type, is_active, hourly_rate, id);
+CREATE INDEX IF NOT EXISTS idx_providers_active_rating ON providers (is_active, rating DESC, id);
+CREATE INDEX IF NOT EXISTS idx_providers_active_rate ON providers (is_active, hourly_rate, id);
+
+-- Full-text search over provider names and location, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS providers_fts USING fts5(
+    business_name,
+    full_name,
+    location,
+    content='providers',
+    content_rowid='rowid'
+);
+
+CREATE TRIGGER IF NOT EXISTS providers_fts_ai AFTER INSERT ON providers BEGIN
+    INSERT INTO providers_fts (rowid, business_name, full_name, location)
+    VALUES (new.rowid, new.business_name, new.full_name, new.location);
+END;
+
+CREATE TRIGGER IF NOT EXISTS providers_fts_ad AFTER DELETE ON providers BEGIN
+    INSERT INTO providers_fts (providers_fts, rowid, business_name, full_name, location)
+    VALUES ('delete', old.rowid, old.business_name, old.full_name, old.location);
+END;
+
+CREATE TRIGGER IF NOT EXISTS providers_fts_au AFTER UPDATE OF business_name, full_name, location ON providers BEGIN
+    INSERT INTO providers_fts (providers_fts, rowid, business_name, full_name, location)
+    VALUES ('delete', old.rowid, old.business_name, old.full_name, old.location);
+    INSERT INTO providers_fts (rowid, business_name, full_name, location)
+    VALUES (new.rowid, new.business_name, new.full_name, new.location);
+END;
+
+-- Content-addressed upload store; refcount = provider image columns pointing at the blob
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs (updated_at) WHERE refcount <= 0;
+
+-- Refresh tokens, stored as SHA-256 hashes. Each refresh replaces the token with a
+-- new one in the same family; presenting a replaced token revokes the family.
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id TEXT PRIMARY KEY,
+    token_hash TEXT UNIQUE NOT NULL,
+    family_id TEXT NOT NULL,
+    user_type TEXT NOT NULL,
+    principal_id TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    replaced_by TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family ON refresh_tokens (family_id) WHERE revoked_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_principal ON refresh_tokens (user_type, principal_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires_at ON refresh_tokens (expires_at);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_revoked_at ON refresh_tokens (revoked_at) WHERE revoked_at IS NOT NULL;
+
+-- Provider change feed. Every insert or update stamps the row with the next value
+-- of sync_state.seq; a delete leaves a tombstone with its own sequence number.
+-- Sequences are assigned inside the (single) write transaction, so they are
+-- committed in order and "change_seq > cursor" never misses a change.
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO sync_state (name, seq) VALUES ('providers', 0);
+
+CREATE TABLE IF NOT EXISTS provider_tombstones (
+    id TEXT PRIMARY KEY,
+    change_seq INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_providers_change_seq ON providers (change_seq);
+CREATE INDEX IF NOT EXISTS idx_provider_tombstones_change_seq ON provider_tombstones (change_seq);
+
+-- Rows that predate the change feed, numbered once after the current sequence
+UPDATE providers SET change_seq = (SELECT seq FROM sync_state WHERE name = 'providers') + rowid
+WHERE change_seq IS NULL;
+UPDATE sync_state SET seq = max(seq, (SELECT coalesce(max(change_seq), 0) FROM providers))
+WHERE name = 'providers';
+
+CREATE TRIGGER IF NOT EXISTS providers_seq_ai AFTER INSERT ON providers BEGIN
+    UPDATE sync_state SET seq = seq + 1 WHERE name = 'providers';
+    UPDATE providers SET change_seq = (SELECT seq FROM sync_state WHERE name = 'providers')
+    WHERE rowid = new.rowid;
+    DELETE FROM provider_tombstones WHERE id = new.id;
+END;
+
+-- The WHEN clause skips the triggers' own change_seq updates
+CREATE TRIGGER IF NOT EXISTS providers_seq_au AFTER UPDATE ON providers
+WHEN new.change_seq IS old.change_seq BEGIN
+    UPDATE sync_state SET seq = seq + 1 WHERE name = 'providers';
+    UPDATE providers SET change_seq = (SELECT seq FROM sync_state WHERE name = 'providers')
+    WHERE rowid = new.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS providers_seq_ad AFTER DELETE ON providers BEGIN
+    UPDATE sync_state SET seq = seq + 1 WHERE name = 'providers';
+    INSERT OR REPLACE INTO provider_tombstones (id, change_seq, deleted_at)
+    VALUES (old.id, (SELECT seq FROM sync_state WHERE name = 'providers'), CURRENT_TIMESTAMP);
+END;
+
+-- Customer reviews; providers.rating_sum/reviews_count/rating are running totals
+-- updated in the same transaction as each review write
+CREATE TABLE IF NOT EXISTS reviews (
+    id TEXT PRIMARY KEY,
+    provider_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5),
+    comment TEXT,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    UNIQUE (provider_id, user_id)
+);
+
+-- Per-provider listing: WHERE provider_id = ? ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_reviews_provider_created_at_id ON reviews (provider_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_reviews_user_id ON reviews (user_id);
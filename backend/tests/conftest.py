@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+# database reads SQLITE_DB_PATH at import time, so point it at a scratch
+# database before anything imports the app
+_tmp = tempfile.mkdtemp(prefix="marketplace-tests-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "test.db")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_tmp, "uploads"))
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("AUTH_IP_RATE_PER_MINUTE", "0")
+os.environ.setdefault("AUTH_ACCOUNT_RATE_PER_MINUTE", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import database
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    database.init_db()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
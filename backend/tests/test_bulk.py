@@ -0,0 +1,44 @@
+import asyncio
+import json
+import uuid
+
+from modules.auth import load_principal, principal_cache
+from modules.passwords import hasher, pwd_context
+from modules.users.service import import_users
+
+HASHED = pwd_context.hash("secret-password")
+
+
+def _import(records, upsert=False) -> dict:
+    async def chunks():
+        yield "\n".join(json.dumps(record) for record in records).encode()
+
+    return asyncio.run(import_users(chunks(), upsert=upsert))
+
+
+def test_upsert_import_drops_cached_principals():
+    email = f"{uuid.uuid4()}@example.com"
+    record = {"email": email, "full_name": "Imported", "password": HASHED}
+    assert _import([record])["imported"] == 1
+    # Cache the principal under the stored id, then deactivate it by email alone
+    principal = asyncio.run(load_principal("customer", None, email))
+    assert principal.is_active
+    assert principal_cache.get(("customer", principal.id)) is not None
+
+    report = _import([{**record, "id": str(uuid.uuid4()), "is_active": False}], upsert=True)
+    assert report["imported"] == 1
+    assert principal_cache.get(("customer", principal.id)) is None
+    assert not asyncio.run(load_principal("customer", principal.id)).is_active
+
+
+def test_hasher_overload_fails_only_that_line(monkeypatch):
+    monkeypatch.setattr(hasher, "max_pending", 0)
+    records = [
+        {"email": f"{uuid.uuid4()}@example.com", "full_name": "Plain", "password": "secret-password"},
+        {"email": f"{uuid.uuid4()}@example.com", "full_name": "Hashed", "password": HASHED},
+    ]
+    report = _import(records)
+    assert report["imported"] == 1
+    assert report["failed"] == 1
+    assert report["errors"][0]["line"] == 1
+    assert "Password hashing unavailable" in report["errors"][0]["error"]
@@ -0,0 +1,45 @@
+import asyncio
+import uuid
+
+from modules.cache import TTLCache
+from modules.users import service as users
+
+
+def test_set_skips_values_loaded_before_an_invalidation():
+    cache = TTLCache("test", maxsize=2)
+    generation = cache.generation()
+    cache.invalidate("a")
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is None
+
+    # Other keys, and loads that start after the invalidation, are cached
+    cache.set("b", "fresh", generation=generation)
+    cache.set("a", "fresh", generation=cache.generation())
+    assert (cache.get("a"), cache.get("b")) == ("fresh", "fresh")
+
+    generation = cache.generation()
+    cache.clear()
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is None
+
+    # Once "c"'s stamp is pushed out, any load older than it is treated as stale
+    generation = cache.generation()
+    for key in ("c", "d", "e"):
+        cache.invalidate(key)
+    cache.set("c", "stale", generation=generation)
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("c") is None and cache.get("a") is None
+
+
+def test_read_racing_an_invalidation_is_not_cached(monkeypatch):
+    user_id = str(uuid.uuid4())
+
+    async def query_then_write(query, params=None):
+        row = {"id": user_id, "email": f"{user_id}@example.com", "full_name": "Before"}
+        # A write commits and invalidates while this read is in flight
+        users.invalidate_user(user_id)
+        return row
+
+    monkeypatch.setattr(users, "execute_query_one_async", query_then_write)
+    assert asyncio.run(users.get_user_by_id(user_id))["full_name"] == "Before"
+    assert users.user_cache.get(user_id) is None
@@ -0,0 +1,33 @@
+import asyncio
+import importlib
+import sys
+import uuid
+
+import database
+from modules.providers import service
+
+
+def test_search_falls_back_to_sql_without_numpy(monkeypatch):
+    # A None entry makes "import numpy" raise ImportError
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    monkeypatch.delitem(sys.modules, "modules.providers.index")
+    index = importlib.import_module("modules.providers.index")
+    assert index.np is None
+
+    provider_index = index.ProviderIndex(enabled=True)
+    assert not provider_index.enabled
+    assert provider_index.search() is None
+    monkeypatch.setattr(service, "provider_index", provider_index)
+
+    provider_id = str(uuid.uuid4())
+    with database.transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO providers (id, email, full_name, password, service_type, hourly_rate, rating,
+                                   created_at, updated_at)
+            VALUES (?, ?, 'Indexless', 'x', 'gardening', 123.5, 4.5, datetime('now'), datetime('now'))
+            """,
+            (provider_id, f"{provider_id}@example.com"),
+        )
+    results = asyncio.run(service.search_providers(service_type="gardening", min_rate=123, max_rate=124))
+    assert provider_id in [provider["id"] for provider in results]
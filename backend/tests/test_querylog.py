@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import database
+from database import UnitOfWork
+from modules.writer import writer
+
+
+def test_callback_statements_reach_query_hooks():
+    seen = []
+
+    def hook(query, params, seconds, rows):
+        seen.append((" ".join(query.split()), rows))
+
+    database.add_query_hook(hook)
+    try:
+        user_id = str(uuid.uuid4())
+
+        def insert(conn):
+            conn.execute(
+                """
+                INSERT INTO users (id, email, full_name, password, created_at, updated_at)
+                VALUES (?, ?, 'Traced', 'x', datetime('now'), datetime('now'))
+                """,
+                (user_id, f"{user_id}@example.com"),
+            )
+
+        def rename(conn):
+            conn.execute("UPDATE users SET full_name = 'Renamed' WHERE id = ?", (user_id,))
+
+        async def main():
+            await writer.run(insert)
+            uow = UnitOfWork()
+            try:
+                await uow.run(rename)
+                await uow.commit()
+            finally:
+                await uow.close()
+
+        asyncio.run(main())
+        with database.transaction() as conn:
+            conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    finally:
+        database.query_hooks.remove(hook)
+        writer.stop()
+
+    statements = [(query.split(" ")[0], rows) for query, rows in seen]
+    assert ("INSERT", 1) in statements
+    assert ("UPDATE", 1) in statements
+    assert ("DELETE", 1) in statements
+
+
+def test_slow_query_plan_is_captured_off_the_calling_thread(monkeypatch):
+    from modules import querylog
+
+    explained_on = []
+    real_explain = querylog.explain
+
+    def explain(query, params=None):
+        explained_on.append(threading.current_thread())
+        return real_explain(query, params)
+
+    monkeypatch.setattr(querylog, "explain", explain)
+    log = querylog.QueryLog(slow_ms=0)
+    database.add_query_hook(log.record)
+    try:
+        # The caller holds a pooled connection while the hook runs
+        with database.transaction() as conn:
+            conn.execute("SELECT count(*) FROM users WHERE full_name = ?", ("Planned",)).fetchone()
+    finally:
+        database.query_hooks.remove(log.record)
+
+    deadline = time.monotonic() + 5
+    while not log.top(sort="count")[0]["plan"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert log.top(sort="count")[0]["plan"]
+    assert explained_on and threading.current_thread() not in explained_on
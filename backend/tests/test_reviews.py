@@ -0,0 +1,45 @@
+import uuid
+
+import database
+
+
+def _register_customer(client) -> dict:
+    response = client.post(
+        "/api/users/register",
+        json={"email": f"{uuid.uuid4()}@example.com", "full_name": "Reviewer", "password": "secret-password"},
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def _insert_provider() -> str:
+    provider_id = str(uuid.uuid4())
+    with database.transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO providers (id, email, full_name, password, created_at, updated_at)
+            VALUES (?, ?, 'Reviewed', 'x', datetime('now'), datetime('now'))
+            """,
+            (provider_id, f"{provider_id}@example.com"),
+        )
+    return provider_id
+
+
+def test_review_update_rejects_null_rating(client):
+    headers = _register_customer(client)
+    provider_id = _insert_provider()
+    review = client.post("/api/reviews/", json={"provider_id": provider_id, "rating": 4}, headers=headers)
+    assert review.status_code == 201, review.text
+    review_id = review.json()["id"]
+
+    response = client.put(f"/api/reviews/{review_id}", json={"rating": None}, headers=headers)
+    assert response.status_code == 422
+
+    # Leaving rating out keeps it, and the provider's totals are untouched
+    response = client.put(f"/api/reviews/{review_id}", json={"comment": "Still good"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["rating"] == 4
+    provider = database.execute_query_one(
+        "SELECT rating, rating_sum, reviews_count FROM providers WHERE id = ?", (provider_id,)
+    )
+    assert (provider["rating"], provider["rating_sum"], provider["reviews_count"]) == (4, 4, 1)
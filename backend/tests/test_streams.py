@@ -0,0 +1,50 @@
+import asyncio
+import uuid
+
+import database
+from modules.providers.service import provider_changes
+
+
+def _insert_providers(count: int) -> list:
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    with database.transaction() as conn:
+        for provider_id in ids:
+            conn.execute(
+                """
+                INSERT INTO providers (id, email, full_name, password, created_at, updated_at)
+                VALUES (?, ?, 'Streamed', 'x', datetime('now'), datetime('now'))
+                """,
+                (provider_id, f"{provider_id}@example.com"),
+            )
+    return ids
+
+
+def test_keyset_stream_reads_every_row_once():
+    ids = _insert_providers(25)
+
+    async def main():
+        seen = []
+        async for rows in database.stream_keyset_async(
+            "providers", "id, created_at", ("created_at", "id"), "full_name = ?", ("Streamed",), batch_size=7
+        ):
+            seen.extend(row["id"] for row in rows)
+        return seen
+
+    seen = asyncio.run(main())
+    assert sorted(seen) == sorted(ids)
+
+
+def test_slow_stream_holds_no_pooled_connection():
+    _insert_providers(10)
+
+    async def main():
+        seq, stream = await provider_changes(0)
+        chunks = 0
+        async for _ in stream:
+            chunks += 1
+            # A slow client between batches: the pool must be fully idle
+            stats = database.pool.stats()
+            assert stats["idle"] == stats["opened"]
+        return chunks
+
+    assert asyncio.run(main()) >= 1
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+import database
+from modules.tokens import purge_expired
+
+
+def test_purge_expired_counts_deleted_tokens():
+    now = datetime.utcnow()
+    rows = [
+        # expired, revoked long ago, still valid
+        ("purge-expired", now - timedelta(days=1), None),
+        ("purge-revoked", now + timedelta(days=1), now - timedelta(days=365)),
+        ("purge-live", now + timedelta(days=1), None),
+    ]
+    with database.transaction() as conn:
+        for token_id, expires_at, revoked_at in rows:
+            conn.execute(
+                """
+                INSERT INTO refresh_tokens
+                    (id, token_hash, family_id, user_type, principal_id, created_at, expires_at, revoked_at)
+                VALUES (?, ?, ?, 'customer', 'someone', ?, ?, ?)
+                """,
+                (token_id, token_id, token_id, now, expires_at, revoked_at),
+            )
+
+    assert purge_expired() == 2
+    remaining = {row["id"] for row in database.execute_query("SELECT id FROM refresh_tokens WHERE id LIKE 'purge-%'")}
+    assert remaining == {"purge-live"}
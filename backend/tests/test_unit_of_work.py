@@ -0,0 +1,65 @@
+import asyncio
+import time
+import uuid
+
+import database
+from database import UnitOfWork
+
+
+def _insert_user() -> str:
+    user_id = str(uuid.uuid4())
+    database.execute_query(
+        """
+        INSERT INTO users (id, email, full_name, password, created_at, updated_at)
+        VALUES (?, ?, 'Counter', 'x', datetime('now'), datetime('now'))
+        """,
+        (user_id, f"{user_id}@example.com"),
+    )
+    return user_id
+
+
+async def _rename(user_id: str, n: int):
+    uow = UnitOfWork()
+    try:
+        # Read, yield to the other requests, then write: the shape of the
+        # PUT/DELETE routes
+        row = await uow.execute_one("SELECT full_name FROM users WHERE id = ?", (user_id,))
+        await asyncio.sleep(0)
+        await uow.execute_one(
+            "UPDATE users SET full_name = ? WHERE id = ? RETURNING id", (f"{row['full_name']}+{n}", user_id)
+        )
+        await uow.commit()
+    finally:
+        await uow.close()
+
+
+def test_overlapping_units_of_work_all_commit():
+    user_id = _insert_user()
+    concurrency = database.POOL_SIZE * 4
+
+    async def main():
+        return await asyncio.gather(*(_rename(user_id, n) for n in range(concurrency)), return_exceptions=True)
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+
+    assert [r for r in results if isinstance(r, BaseException)] == []
+    name = database.execute_query_one("SELECT full_name FROM users WHERE id = ?", (user_id,))["full_name"]
+    # Every read saw the previous commit, so no update was lost
+    assert name.count("+") == concurrency
+    assert elapsed < 2
+
+
+def test_uncommitted_unit_of_work_rolls_back():
+    user_id = _insert_user()
+
+    async def main():
+        uow = UnitOfWork()
+        try:
+            await uow.execute("UPDATE users SET full_name = 'Changed' WHERE id = ?", (user_id,))
+        finally:
+            await uow.close()
+
+    asyncio.run(main())
+    assert database.execute_query_one("SELECT full_name FROM users WHERE id = ?", (user_id,))["full_name"] == "Counter"
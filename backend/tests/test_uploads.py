@@ -0,0 +1,51 @@
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from modules.uploads import MultipartSizeLimitMiddleware
+
+
+def _client(max_bytes: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(MultipartSizeLimitMiddleware, max_bytes=max_bytes)
+
+    @app.post("/form")
+    async def form(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/raw")
+    async def raw(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_multipart_body_over_the_limit_is_refused():
+    client = _client(max_bytes=4096)
+    assert client.post("/form", files={"file": ("a.bin", b"x" * 100)}).json() == {"size": 100}
+
+    response = client.post("/form", files={"file": ("a.bin", b"x" * 10_000)})
+    assert response.status_code == 413
+
+
+def test_chunked_multipart_body_is_counted_as_it_arrives():
+    client = _client(max_bytes=4096)
+    boundary = "limit-test"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.bin\"\r\n\r\n".encode()
+        + b"x" * 10_000 + f"\r\n--{boundary}--\r\n".encode()
+    )
+
+    def chunks():
+        for start in range(0, len(body), 1024):
+            yield body[start:start + 1024]
+
+    response = client.post(
+        "/form", content=chunks(), headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert response.status_code == 413
+
+
+def test_other_bodies_are_not_limited():
+    client = _client(max_bytes=4096)
+    response = client.post("/raw", content=b"x" * 10_000, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json() == {"size": 10_000}